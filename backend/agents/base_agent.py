@@ -2,19 +2,22 @@
 Base Agent - Foundation class for all agents
 Provides common functionality for Claude API calls and tool management
 """
-import json
+import asyncio
 import uuid
-from abc import ABC, abstractmethod
+from collections import deque
+from contextvars import ContextVar
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Callable
 from dataclasses import dataclass, field
 
 import httpx
+import orjson
 
 from config import settings
+from services.claude_json import parse_json_reply
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentResult:
     """Result from an agent run"""
     success: bool
@@ -24,7 +27,7 @@ class AgentResult:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentRunInfo:
     """Information about an agent run"""
     run_id: str
@@ -36,7 +39,7 @@ class AgentRunInfo:
     total_steps: int = 0
 
 
-class BaseAgent(ABC):
+class BaseAgent:
     """
     Base class for all agents in the MailMind AI system.
 
@@ -47,6 +50,15 @@ class BaseAgent(ABC):
     - Error handling and logging
     """
 
+    # Number of finished runs kept in run_history
+    RUN_HISTORY_SIZE = 256
+
+    # Shared HTTP client for Claude API calls (keeps connections alive across agents)
+    _client: Optional[httpx.AsyncClient] = None
+
+    # Limits concurrent Claude API calls across all agents
+    _claude_semaphore = asyncio.Semaphore(settings.ANTHROPIC_MAX_CONCURRENCY)
+
     def __init__(
         self,
         name: str,
@@ -66,13 +78,38 @@ class BaseAgent(ABC):
         base_url = settings.ANTHROPIC_BASE_URL.rstrip('/')
         self.api_url = f"{base_url}/messages"
 
-        # Run tracking
-        self.current_run: Optional[AgentRunInfo] = None
-        self.run_history: List[AgentRunInfo] = []
+        # Run tracking (runs of one agent may overlap, e.g. in batch execution,
+        # so each task finds its own run through a context variable)
+        self.active_runs: Dict[str, AgentRunInfo] = {}
+        self._run_id: ContextVar[Optional[str]] = ContextVar(f"{name}_run_id", default=None)
+        self.run_history: deque[AgentRunInfo] = deque(maxlen=self.RUN_HISTORY_SIZE)
+        self.total_runs = 0
 
         # Progress callback
         self._progress_callback: Optional[Callable[[int, int, str], None]] = None
 
+    @property
+    def current_run(self) -> Optional[AgentRunInfo]:
+        """The run executing in the current task, if any"""
+        return self.active_runs.get(self._run_id.get())
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        """Get the shared HTTP client, creating it on first use"""
+        if BaseAgent._client is None or BaseAgent._client.is_closed:
+            BaseAgent._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(120.0, connect=10.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+            )
+        return BaseAgent._client
+
+    @classmethod
+    async def aclose(cls):
+        """Close the shared HTTP client (called on application shutdown)"""
+        if BaseAgent._client is not None:
+            await BaseAgent._client.aclose()
+            BaseAgent._client = None
+
     def set_progress_callback(self, callback: Callable[[int, int, str], None]):
         """Set a callback for progress updates: callback(current, total, message)"""
         self._progress_callback = callback
@@ -91,8 +128,10 @@ class BaseAgent(ABC):
         prompt: str,
         system_prompt: Optional[str] = None,
         tools: Optional[List[Dict]] = None,
+        tool_choice: Optional[Dict] = None,
         max_tokens: Optional[int] = None,
-        temperature: Optional[float] = None
+        temperature: Optional[float] = None,
+        stream: bool = False
     ) -> Dict[str, Any]:
         """
         Call Claude API with the given prompt.
@@ -101,8 +140,11 @@ class BaseAgent(ABC):
             prompt: User prompt to send
             system_prompt: Optional system prompt
             tools: Optional list of tool definitions
+            tool_choice: Optional tool choice (e.g. force a specific tool for structured output)
             max_tokens: Override default max_tokens
             temperature: Override default temperature
+            stream: Use the streaming API; content blocks are assembled as events
+                arrive, and a forced tool call returns as soon as its block ends
 
         Returns:
             API response as dict
@@ -131,15 +173,29 @@ class BaseAgent(ABC):
 
         if tools:
             data["tools"] = tools
+            if tool_choice:
+                data["tool_choice"] = tool_choice
 
         if temperature is not None:
             data["temperature"] = temperature
         elif self.temperature is not None:
             data["temperature"] = self.temperature
 
+        if stream:
+            data["stream"] = True
+
         try:
-            async with httpx.AsyncClient(timeout=120) as client:
-                response = await client.post(self.api_url, headers=headers, json=data)
+            client = self.get_client()
+            async with BaseAgent._claude_semaphore:
+                async with client.stream(
+                    "POST", self.api_url, headers=headers, content=orjson.dumps(data)
+                ) as response:
+                    if response.status_code != 200 or not stream:
+                        # Read raw bytes as they arrive; parsed directly without a text decode
+                        body = await response.aread()
+                    else:
+                        stop_after_tool = bool(tool_choice and tool_choice.get("type") == "tool")
+                        result = await self._read_event_stream(response, stop_after_tool)
 
             if response.status_code != 200:
                 return {
@@ -148,7 +204,8 @@ class BaseAgent(ABC):
                     "content": None
                 }
 
-            result = response.json()
+            if not stream:
+                result = orjson.loads(body)
             content = result.get("content", [])
 
             # Extract text content
@@ -180,58 +237,93 @@ class BaseAgent(ABC):
                 "content": None
             }
 
+    async def _read_event_stream(
+        self,
+        response: httpx.Response,
+        stop_after_tool: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Assemble a Messages API event stream into the non-streaming response shape.
+
+        Text deltas are joined per block and tool input JSON is parsed when its
+        block ends. With stop_after_tool, reading stops at the first finished
+        tool_use block (the rest of a forced tool call carries no content).
+        """
+        message: Dict[str, Any] = {}
+        blocks: Dict[int, Dict[str, Any]] = {}
+        parts: Dict[int, List[str]] = {}
+
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            event = orjson.loads(line[5:])
+            event_type = event.get("type")
+
+            if event_type == "message_start":
+                message = event.get("message", {})
+            elif event_type == "content_block_start":
+                blocks[event["index"]] = dict(event.get("content_block", {}))
+                parts[event["index"]] = []
+            elif event_type == "content_block_delta":
+                delta = event.get("delta", {})
+                if delta.get("type") == "text_delta":
+                    parts[event["index"]].append(delta.get("text", ""))
+                elif delta.get("type") == "input_json_delta":
+                    parts[event["index"]].append(delta.get("partial_json", ""))
+            elif event_type == "content_block_stop":
+                block = blocks[event["index"]]
+                joined = "".join(parts.pop(event["index"], []))
+                if block.get("type") == "text":
+                    block["text"] = joined
+                elif block.get("type") == "tool_use":
+                    block["input"] = orjson.loads(joined) if joined else {}
+                    if stop_after_tool:
+                        message["stop_reason"] = "tool_use"
+                        break
+            elif event_type == "message_delta":
+                message.update(event.get("delta", {}))
+                message.setdefault("usage", {}).update(event.get("usage", {}))
+            elif event_type == "error":
+                raise RuntimeError(event.get("error", {}).get("message", "stream error"))
+
+        message["content"] = [blocks[i] for i in sorted(blocks)]
+        return message
+
     def extract_json(self, text: str) -> Optional[Dict]:
-        """Extract JSON from Claude response text"""
+        """Extract JSON from Claude response text (None if there is none)"""
         if not text:
             return None
 
-        # Try to extract JSON from markdown code block
-        if "```json" in text:
-            try:
-                json_str = text.split("```json")[1].split("```")[0].strip()
-                return json.loads(json_str)
-            except (IndexError, json.JSONDecodeError):
-                pass
-
-        # Try to extract from generic code block
-        if "```" in text:
-            try:
-                json_str = text.split("```")[1].split("```")[0].strip()
-                return json.loads(json_str)
-            except (IndexError, json.JSONDecodeError):
-                pass
-
-        # Try to parse the entire text as JSON
         try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        return None
+            return parse_json_reply(text)
+        except orjson.JSONDecodeError:
+            return None
 
     def _start_run(self) -> str:
         """Start a new run and return the run ID"""
         run_id = str(uuid.uuid4())
-        self.current_run = AgentRunInfo(
+        self.active_runs[run_id] = AgentRunInfo(
             run_id=run_id,
             agent_name=self.name,
             started_at=datetime.utcnow(),
             status="running"
         )
+        self._run_id.set(run_id)
         return run_id
 
     def _end_run(self, status: str = "completed"):
-        """End the current run"""
-        if self.current_run:
-            self.current_run.completed_at = datetime.utcnow()
-            self.current_run.status = status
-            self.run_history.append(self.current_run)
-            self.current_run = None
+        """End the current task's run"""
+        run = self.active_runs.pop(self._run_id.get(), None)
+        if run:
+            run.completed_at = datetime.utcnow()
+            run.status = status
+            self.run_history.append(run)
+            self.total_runs += 1
+        self._run_id.set(None)
 
-    @abstractmethod
     async def run(self, input_data: Dict[str, Any]) -> AgentResult:
         """
-        Execute the agent's main logic.
+        Execute the agent's main logic. Subclasses must override this.
 
         Args:
             input_data: Input parameters for the agent
@@ -239,20 +331,23 @@ class BaseAgent(ABC):
         Returns:
             AgentResult with success status and data
         """
-        pass
+        raise NotImplementedError(f"{type(self).__name__} must implement run()")
 
     def get_status(self) -> Dict[str, Any]:
-        """Get current agent status"""
+        """Get current agent status (busy while any run is active)"""
+        # Most recently started active run
+        latest_run = next(reversed(self.active_runs.values()), None)
         return {
             "name": self.name,
             "description": self.description,
-            "status": "busy" if self.current_run else "ready",
+            "status": "busy" if self.active_runs else "ready",
+            "active_runs": len(self.active_runs),
             "current_run": {
-                "run_id": self.current_run.run_id,
-                "started_at": self.current_run.started_at.isoformat(),
-                "progress": self.current_run.progress,
-                "total_steps": self.current_run.total_steps
-            } if self.current_run else None,
-            "total_runs": len(self.run_history),
+                "run_id": latest_run.run_id,
+                "started_at": latest_run.started_at.isoformat(),
+                "progress": latest_run.progress,
+                "total_steps": latest_run.total_steps
+            } if latest_run else None,
+            "total_runs": self.total_runs,
             "last_run": self.run_history[-1].completed_at.isoformat() if self.run_history else None
         }
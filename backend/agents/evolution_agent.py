@@ -2,12 +2,20 @@
 Evolution Agent - Learns from human edits to improve Skills
 Phase 3 of the three-phase agent architecture
 """
-import json
+import logging
+import asyncio
+import hashlib
+import time
 import uuid
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional
 from datetime import datetime
 
-from sqlalchemy import select
+import orjson
+from rapidfuzz.distance import Levenshtein
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import flag_modified
 
 from agents.base_agent import BaseAgent, AgentResult
 from models.database import (
@@ -17,6 +25,55 @@ from services.skill_service import SkillService
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
+
+# Prompt for analyzing human edits (filled with str.format)
+_ANALYZE_PROMPT = """Analyze the differences between an AI-generated reply and the human-edited version.
+Identify improvements that can be applied to the skill rules.
+
+Original Email:
+Subject: {subject}
+Body: {body}
+Category: {category}
+
+AI Draft:
+{ai_draft}
+
+Human Edited Version:
+{human_edited}
+
+Related Skills:
+{skills_info}
+
+Analyze the changes and respond in JSON format:
+
+{{
+    "summary": "Brief summary of what the human changed and why",
+    "improvements": [
+        {{
+            "type": "keyword_added" | "rule_added" | "rule_updated" | "template_improved",
+            "target_skill_name_en": "skill-name-en",
+            "description": "What improvement to make",
+            "details": {{
+                // For keyword_added: {{"keywords": ["new", "keywords"]}}
+                // For rule_added: {{"rule_name": "...", "conditions": [...], "template": "..."}}
+                // For rule_updated: {{"rule_name": "...", "new_template": "..."}}
+                // For template_improved: {{"improved_template": "..."}}
+            }}
+        }}
+    ]
+}}
+
+Guidelines:
+1. Only suggest improvements that reflect meaningful pattern changes
+2. Use {{{{customer_name}}}} and {{{{company_name}}}} placeholders in templates
+3. If no clear improvements, return empty improvements array
+4. Focus on reusable patterns, not one-time fixes
+
+Only return the JSON, nothing else."""
+
+
 class EvolutionAgent(BaseAgent):
     """
     Evolution Agent - Learns from human edits to improve Skills.
@@ -32,6 +89,18 @@ class EvolutionAgent(BaseAgent):
     # Minimum edit distance to trigger analysis
     MIN_EDIT_THRESHOLD = 20  # characters
 
+    # How long the category -> skills index is reused before reloading
+    CATEGORY_INDEX_TTL = 60  # seconds
+
+    # Prompt size limits for difference analysis
+    MAX_DRAFT_CHARS = 4000
+    MAX_EDIT_CHARS = 4000
+    MAX_RULES_PER_SKILL = 10
+
+    # Cache of Claude analyses keyed by input hash (identical edits reuse the result)
+    ANALYSIS_CACHE_TTL = 3600  # seconds
+    ANALYSIS_CACHE_SIZE = 256
+
     def __init__(self):
         super().__init__(
             name="EvolutionAgent",
@@ -42,6 +111,13 @@ class EvolutionAgent(BaseAgent):
         )
         self.skill_service = SkillService()
 
+        # Cached category -> related skills index (see _get_category_index)
+        self._category_index: Optional[Dict[str, List[Dict]]] = None
+        self._category_index_loaded_at = 0.0
+
+        # input hash -> (cached_at, analysis)
+        self._analysis_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
     async def run(self, input_data: Dict[str, Any]) -> AgentResult:
         """
         Analyze a human-edited reply and evolve related Skills.
@@ -161,6 +237,7 @@ class EvolutionAgent(BaseAgent):
             # Step 5: Save skills
             self._update_progress(5, 5, "Saving updated skills...")
             await self.skill_service.save_to_file()
+            self._category_index = None
 
             self._end_run("completed")
 
@@ -188,26 +265,37 @@ class EvolutionAgent(BaseAgent):
         """Get reply and associated email"""
         async with async_session() as session:
             result = await session.execute(
-                select(Reply).where(Reply.id == reply_id)
+                select(Reply, Email)
+                .outerjoin(Email, Email.id == Reply.email_id)
+                .where(Reply.id == reply_id)
             )
-            reply = result.scalar_one_or_none()
+            row = result.one_or_none()
 
-            if not reply:
+            if not row:
                 return None, None
 
-            email_result = await session.execute(
-                select(Email).where(Email.id == reply.email_id)
-            )
-            email = email_result.scalar_one_or_none()
-
-            return reply, email
+            return row[0], row[1]
 
     def _calculate_edit_distance(self, original: str, edited: str) -> int:
-        """Calculate simple character difference between texts"""
+        """
+        Calculate the Levenshtein distance between texts.
+
+        Scanning stops once the distance exceeds MIN_EDIT_THRESHOLD, in which
+        case MIN_EDIT_THRESHOLD + 1 is returned.
+        """
         if not original or not edited:
             return 0
-        return abs(len(edited) - len(original)) + sum(
-            1 for a, b in zip(original, edited) if a != b
+
+        # Length difference is a lower bound on edit distance, so large
+        # rewrites are known to be significant without scanning
+        length_delta = abs(len(edited) - len(original))
+        if length_delta >= self.MIN_EDIT_THRESHOLD:
+            return length_delta
+
+        return Levenshtein.distance(
+            original,
+            edited,
+            score_cutoff=self.MIN_EDIT_THRESHOLD
         )
 
     async def _find_related_skills(self, email: Email) -> List[Dict]:
@@ -217,20 +305,31 @@ class EvolutionAgent(BaseAgent):
 
         # Also get skill by category if no direct match
         if not matched and email.category:
-            all_skills = await self.skill_service.get_all_skills()
-            matched = [
-                {
+            category_index = await self._get_category_index()
+            matched = list(category_index.get(email.category, []))
+
+        return matched
+
+    async def _get_category_index(self) -> Dict[str, List[Dict]]:
+        """Get active skills grouped by category, reloading after CATEGORY_INDEX_TTL"""
+        now = time.monotonic()
+        if (
+            self._category_index is None
+            or now - self._category_index_loaded_at > self.CATEGORY_INDEX_TTL
+        ):
+            index: Dict[str, List[Dict]] = {}
+            for s in await self.skill_service.get_all_skills():
+                index.setdefault(s.category, []).append({
                     "id": s.id,
                     "name": s.name,
                     "name_en": s.name_en,
                     "category": s.category,
-                    "rules": s.rules
-                }
-                for s in all_skills
-                if s.category == email.category
-            ]
+                    "rules": [r.model_dump() for r in s.rules]
+                })
+            self._category_index = index
+            self._category_index_loaded_at = now
 
-        return matched
+        return self._category_index
 
     async def _analyze_differences(
         self,
@@ -241,66 +340,53 @@ class EvolutionAgent(BaseAgent):
     ) -> Optional[Dict]:
         """Use Claude to analyze differences and suggest improvements"""
 
-        skills_info = json.dumps([
+        skills_info = orjson.dumps([
             {
                 "name": s.get("name"),
                 "name_en": s.get("name_en"),
                 "category": s.get("category"),
-                "rules": [r.get("name") for r in s.get("rules", [])]
+                "rules": [r.get("name") for r in s.get("rules", [])[:self.MAX_RULES_PER_SKILL]]
             }
             for s in related_skills
-        ], ensure_ascii=False, indent=2)
-
-        prompt = f"""Analyze the differences between an AI-generated reply and the human-edited version.
-Identify improvements that can be applied to the skill rules.
-
-Original Email:
-Subject: {email.subject}
-Body: {email.body[:1000]}
-Category: {email.category}
-
-AI Draft:
-{ai_draft}
-
-Human Edited Version:
-{human_edited}
-
-Related Skills:
-{skills_info}
-
-Analyze the changes and respond in JSON format:
-
-{{
-    "summary": "Brief summary of what the human changed and why",
-    "improvements": [
-        {{
-            "type": "keyword_added" | "rule_added" | "rule_updated" | "template_improved",
-            "target_skill_name_en": "skill-name-en",
-            "description": "What improvement to make",
-            "details": {{
-                // For keyword_added: {{"keywords": ["new", "keywords"]}}
-                // For rule_added: {{"rule_name": "...", "conditions": [...], "template": "..."}}
-                // For rule_updated: {{"rule_name": "...", "new_template": "..."}}
-                // For template_improved: {{"improved_template": "..."}}
-            }}
-        }}
-    ]
-}}
-
-Guidelines:
-1. Only suggest improvements that reflect meaningful pattern changes
-2. Use {{{{customer_name}}}} and {{{{company_name}}}} placeholders in templates
-3. If no clear improvements, return empty improvements array
-4. Focus on reusable patterns, not one-time fixes
-
-Only return the JSON, nothing else."""
+        ], option=orjson.OPT_INDENT_2).decode()
+
+        cache_key = hashlib.blake2b(orjson.dumps([
+            email.id,
+            ai_draft,
+            human_edited,
+            [s.get("id") for s in related_skills]
+        ])).hexdigest()
+
+        cached = self._analysis_cache.get(cache_key)
+        if cached:
+            cached_at, analysis = cached
+            if time.monotonic() - cached_at <= self.ANALYSIS_CACHE_TTL:
+                self._analysis_cache.move_to_end(cache_key)
+                return analysis
+            del self._analysis_cache[cache_key]
+
+        prompt = _ANALYZE_PROMPT.format(
+            subject=email.subject,
+            body=email.body[:1000],
+            category=email.category,
+            ai_draft=ai_draft[:self.MAX_DRAFT_CHARS],
+            human_edited=human_edited[:self.MAX_EDIT_CHARS],
+            skills_info=skills_info
+        )
 
         response = await self.call_claude(prompt)
 
         if not response.get("success"):
             return None
 
-        return self.extract_json(response.get("content", ""))
+        analysis = self.extract_json(response.get("content", ""))
+
+        if analysis is not None:
+            self._analysis_cache[cache_key] = (time.monotonic(), analysis)
+            if len(self._analysis_cache) > self.ANALYSIS_CACHE_SIZE:
+                self._analysis_cache.popitem(last=False)
+
+        return analysis
 
     async def _apply_improvements(
         self,
@@ -310,12 +396,12 @@ Only return the JSON, nothing else."""
         email_id: str
     ) -> List[Dict]:
         """Apply improvements to skills"""
-        applied_changes = []
-
+        # Group improvements by target skill. Different skills are updated
+        # concurrently; improvements to the same skill run in order so they
+        # don't overwrite each other's changes.
+        by_skill: Dict[str, List[tuple]] = {}
         for improvement in improvements:
-            imp_type = improvement.get("type")
             target_skill_name_en = improvement.get("target_skill_name_en")
-            details = improvement.get("details", {})
 
             # Find target skill
             target_skill = next(
@@ -326,63 +412,41 @@ Only return the JSON, nothing else."""
             if not target_skill:
                 continue
 
-            skill_id = target_skill.get("id")
-
-            try:
-                if imp_type == "keyword_added":
-                    change = await self._add_keywords(
-                        skill_id,
-                        details.get("keywords", []),
-                        reply_id
-                    )
-                elif imp_type == "rule_added":
-                    change = await self._add_rule(
-                        skill_id,
-                        details,
-                        reply_id
-                    )
-                elif imp_type == "rule_updated":
-                    change = await self._update_rule(
-                        skill_id,
-                        details,
-                        reply_id
-                    )
-                elif imp_type == "template_improved":
-                    change = await self._improve_template(
-                        skill_id,
-                        details.get("improved_template", ""),
-                        reply_id
-                    )
-                else:
-                    continue
+            by_skill.setdefault(target_skill.get("id"), []).append(
+                (improvement, target_skill)
+            )
 
-                if change:
-                    change["skill_name"] = target_skill.get("name")
-                    applied_changes.append(change)
+        # One timestamp for every row touched in this run
+        now = datetime.utcnow()
 
-                    # Record source email for evolution
-                    await self._record_evolution_source(
-                        skill_id,
-                        email_id,
-                        improvement.get("description", "")
-                    )
+        results = await asyncio.gather(
+            *[
+                self._apply_skill_improvements(skill_improvements, reply_id, email_id, now)
+                for skill_improvements in by_skill.values()
+            ],
+            return_exceptions=True
+        )
 
-            except Exception as e:
-                # Log error but continue with other improvements
-                print(f"Error applying improvement: {e}")
+        applied_changes = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error("Error applying improvement: %s", result)
                 continue
+            applied_changes.extend(result)
 
         return applied_changes
 
-    async def _add_keywords(
+    async def _apply_skill_improvements(
         self,
-        skill_id: str,
-        keywords: List[str],
-        reply_id: str
-    ) -> Optional[Dict]:
-        """Add new keywords to a skill"""
-        if not keywords:
-            return None
+        skill_improvements: List[tuple],
+        reply_id: str,
+        email_id: str,
+        now: datetime
+    ) -> List[Dict]:
+        """Apply improvements targeting a single skill in one transaction"""
+        applied = []
+        change_logs: List[SkillChangeLog] = []
+        skill_id = skill_improvements[0][1].get("id")
 
         async with async_session() as session:
             result = await session.execute(
@@ -391,220 +455,291 @@ Only return the JSON, nothing else."""
             skill = result.scalar_one_or_none()
 
             if not skill:
-                return None
-
-            # Add new keywords (avoid duplicates)
-            existing = set(kw.lower() for kw in skill.trigger_keywords or [])
-            new_keywords = [kw for kw in keywords if kw.lower() not in existing]
-
-            if not new_keywords:
-                return None
-
-            skill.trigger_keywords = (skill.trigger_keywords or []) + new_keywords
-            skill.updated_at = datetime.utcnow()
-
-            # Log change
-            change_log = SkillChangeLog(
-                id=str(uuid.uuid4()),
-                skill_id=skill_id,
-                change_type="keyword_added",
-                change_detail={
-                    "added_keywords": new_keywords,
-                    "total_keywords": len(skill.trigger_keywords)
-                },
-                triggered_by_reply_id=reply_id
+                return applied
+
+            source_detail = None
+            for improvement, target_skill in skill_improvements:
+                try:
+                    change = self._dispatch_improvement(
+                        skill, improvement, reply_id, change_logs
+                    )
+                except Exception as e:
+                    # Log error but continue with other improvements
+                    logger.error("Error applying improvement: %s", e)
+                    continue
+
+                if change:
+                    change["skill_name"] = target_skill.get("name")
+                    applied.append(change)
+                    if source_detail is None:
+                        source_detail = improvement.get("description", "")
+
+            if not applied:
+                return applied
+
+            skill.updated_at = now
+            for change_log in change_logs:
+                change_log.created_at = now
+
+            # Record source email for evolution
+            new_rows: List[Any] = list(change_logs)
+            source = await self._record_evolution_source(
+                session, skill_id, email_id, source_detail
             )
-            session.add(change_log)
+            if source:
+                source.created_at = now
+                new_rows.append(source)
 
+            session.add_all(new_rows)
             await session.commit()
 
-            return {
-                "change_type": "keyword_added",
-                "skill_id": skill_id,
-                "detail": f"Added keywords: {', '.join(new_keywords)}"
-            }
+        SkillService.bump_version()
+        return applied
 
-    async def _add_rule(
+    def _dispatch_improvement(
         self,
-        skill_id: str,
-        rule_details: Dict,
-        reply_id: str
+        skill: Skill,
+        improvement: Dict,
+        reply_id: str,
+        change_logs: List[SkillChangeLog]
     ) -> Optional[Dict]:
-        """Add a new rule to a skill"""
-        async with async_session() as session:
-            result = await session.execute(
-                select(Skill).where(Skill.id == skill_id)
+        """Route an improvement to the handler for its type"""
+        imp_type = improvement.get("type")
+        details = improvement.get("details", {})
+
+        if imp_type == "keyword_added":
+            return self._add_keywords(
+                skill,
+                details.get("keywords", []),
+                reply_id,
+                change_logs
             )
-            skill = result.scalar_one_or_none()
+        elif imp_type == "rule_added":
+            return self._add_rule(
+                skill,
+                details,
+                reply_id,
+                change_logs
+            )
+        elif imp_type == "rule_updated":
+            return self._update_rule(
+                skill,
+                details,
+                reply_id,
+                change_logs
+            )
+        elif imp_type == "template_improved":
+            return self._improve_template(
+                skill,
+                details.get("improved_template", ""),
+                reply_id,
+                change_logs
+            )
+        return None
 
-            if not skill:
-                return None
-
-            new_rule = {
-                "rule_id": f"rule_{uuid.uuid4().hex[:8]}",
-                "name": rule_details.get("rule_name", "Auto-generated Rule"),
-                "trigger_keywords": rule_details.get("trigger_keywords", []),
-                "conditions": rule_details.get("conditions", []),
-                "action_steps": rule_details.get("action_steps", []),
-                "response_template": rule_details.get("template", ""),
-                "priority": rule_details.get("priority", 5)
-            }
+    def _add_keywords(
+        self,
+        skill: Skill,
+        keywords: List[str],
+        reply_id: str,
+        change_logs: List[SkillChangeLog]
+    ) -> Optional[Dict]:
+        """Add new keywords to a skill"""
+        if not keywords:
+            return None
 
-            skill.rules = (skill.rules or []) + [new_rule]
-            skill.updated_at = datetime.utcnow()
-
-            # Log change
-            change_log = SkillChangeLog(
-                id=str(uuid.uuid4()),
-                skill_id=skill_id,
-                change_type="rule_added",
-                change_detail={
-                    "rule_id": new_rule["rule_id"],
-                    "rule_name": new_rule["name"]
-                },
-                triggered_by_reply_id=reply_id
-            )
-            session.add(change_log)
+        # Add new keywords (avoid duplicates)
+        existing = skill.trigger_keywords_lc
+        new_keywords = []
+        for kw in keywords:
+            kw_lower = kw.lower()
+            if kw_lower not in existing:
+                existing.add(kw_lower)
+                new_keywords.append(kw)
 
-            await session.commit()
+        if not new_keywords:
+            return None
 
-            return {
-                "change_type": "rule_added",
-                "skill_id": skill_id,
-                "detail": f"Added rule: {new_rule['name']}"
-            }
+        if skill.trigger_keywords is None:
+            skill.trigger_keywords = []
+        skill.trigger_keywords.extend(new_keywords)
+        flag_modified(skill, "trigger_keywords")
+
+        # Log change
+        change_log = SkillChangeLog(
+            id=str(uuid.uuid4()),
+            skill_id=skill.id,
+            change_type="keyword_added",
+            change_detail={
+                "added_keywords": new_keywords,
+                "total_keywords": len(skill.trigger_keywords)
+            },
+            triggered_by_reply_id=reply_id
+        )
+        change_logs.append(change_log)
 
-    async def _update_rule(
+        return {
+            "change_type": "keyword_added",
+            "skill_id": skill.id,
+            "detail": f"Added keywords: {', '.join(new_keywords)}"
+        }
+
+    def _add_rule(
         self,
-        skill_id: str,
+        skill: Skill,
+        rule_details: Dict,
+        reply_id: str,
+        change_logs: List[SkillChangeLog]
+    ) -> Optional[Dict]:
+        """Add a new rule to a skill"""
+        new_rule = {
+            "rule_id": f"rule_{uuid.uuid4().hex[:8]}",
+            "name": rule_details.get("rule_name", "Auto-generated Rule"),
+            "trigger_keywords": rule_details.get("trigger_keywords", []),
+            "conditions": rule_details.get("conditions", []),
+            "action_steps": rule_details.get("action_steps", []),
+            "response_template": rule_details.get("template", ""),
+            "priority": rule_details.get("priority", 5)
+        }
+
+        if skill.rules is None:
+            skill.rules = []
+        skill.rules.append(new_rule)
+        flag_modified(skill, "rules")
+
+        # Log change
+        change_log = SkillChangeLog(
+            id=str(uuid.uuid4()),
+            skill_id=skill.id,
+            change_type="rule_added",
+            change_detail={
+                "rule_id": new_rule["rule_id"],
+                "rule_name": new_rule["name"]
+            },
+            triggered_by_reply_id=reply_id
+        )
+        change_logs.append(change_log)
+
+        return {
+            "change_type": "rule_added",
+            "skill_id": skill.id,
+            "detail": f"Added rule: {new_rule['name']}"
+        }
+
+    def _update_rule(
+        self,
+        skill: Skill,
         update_details: Dict,
-        reply_id: str
+        reply_id: str,
+        change_logs: List[SkillChangeLog]
     ) -> Optional[Dict]:
         """Update an existing rule in a skill"""
         rule_name = update_details.get("rule_name")
         new_template = update_details.get("new_template")
 
-        if not rule_name or not new_template:
+        if not rule_name or not new_template or not skill.rules:
             return None
 
-        async with async_session() as session:
-            result = await session.execute(
-                select(Skill).where(Skill.id == skill_id)
-            )
-            skill = result.scalar_one_or_none()
+        # Find and update rule
+        updated = False
+        old_template = ""
+        for rule in skill.rules:
+            if rule.get("name") == rule_name:
+                old_template = rule.get("response_template", "")
+                rule["response_template"] = new_template
+                updated = True
+                break
+
+        if not updated:
+            return None
 
-            if not skill or not skill.rules:
-                return None
-
-            # Find and update rule
-            updated = False
-            old_template = ""
-            for rule in skill.rules:
-                if rule.get("name") == rule_name:
-                    old_template = rule.get("response_template", "")
-                    rule["response_template"] = new_template
-                    updated = True
-                    break
-
-            if not updated:
-                return None
-
-            skill.updated_at = datetime.utcnow()
-
-            # Log change
-            change_log = SkillChangeLog(
-                id=str(uuid.uuid4()),
-                skill_id=skill_id,
-                change_type="rule_updated",
-                change_detail={
-                    "rule_name": rule_name,
-                    "old_template": old_template[:200],
-                    "new_template": new_template[:200]
-                },
-                triggered_by_reply_id=reply_id
-            )
-            session.add(change_log)
+        flag_modified(skill, "rules")
 
-            await session.commit()
 
-            return {
-                "change_type": "rule_updated",
-                "skill_id": skill_id,
-                "detail": f"Updated rule template: {rule_name}"
-            }
+        # Log change
+        change_log = SkillChangeLog(
+            id=str(uuid.uuid4()),
+            skill_id=skill.id,
+            change_type="rule_updated",
+            change_detail={
+                "rule_name": rule_name,
+                "old_template": old_template[:200],
+                "new_template": new_template[:200]
+            },
+            triggered_by_reply_id=reply_id
+        )
+        change_logs.append(change_log)
+
+        return {
+            "change_type": "rule_updated",
+            "skill_id": skill.id,
+            "detail": f"Updated rule template: {rule_name}"
+        }
 
-    async def _improve_template(
+    def _improve_template(
         self,
-        skill_id: str,
+        skill: Skill,
         improved_template: str,
-        reply_id: str
+        reply_id: str,
+        change_logs: List[SkillChangeLog]
     ) -> Optional[Dict]:
         """Improve the primary template of a skill's first rule"""
-        if not improved_template:
+        if not improved_template or not skill.rules:
             return None
 
-        async with async_session() as session:
-            result = await session.execute(
-                select(Skill).where(Skill.id == skill_id)
-            )
-            skill = result.scalar_one_or_none()
-
-            if not skill or not skill.rules:
-                return None
-
-            # Update first rule's template
-            old_template = skill.rules[0].get("response_template", "")
-            skill.rules[0]["response_template"] = improved_template
-            skill.updated_at = datetime.utcnow()
-
-            # Log change
-            change_log = SkillChangeLog(
-                id=str(uuid.uuid4()),
-                skill_id=skill_id,
-                change_type="template_improved",
-                change_detail={
-                    "old_template": old_template[:200],
-                    "new_template": improved_template[:200]
-                },
-                triggered_by_reply_id=reply_id
-            )
-            session.add(change_log)
-
-            await session.commit()
+        # Update first rule's template
+        old_template = skill.rules[0].get("response_template", "")
+        skill.rules[0]["response_template"] = improved_template
+        flag_modified(skill, "rules")
+
+        # Log change
+        change_log = SkillChangeLog(
+            id=str(uuid.uuid4()),
+            skill_id=skill.id,
+            change_type="template_improved",
+            change_detail={
+                "old_template": old_template[:200],
+                "new_template": improved_template[:200]
+            },
+            triggered_by_reply_id=reply_id
+        )
+        change_logs.append(change_log)
 
-            return {
-                "change_type": "template_improved",
-                "skill_id": skill_id,
-                "detail": "Improved primary response template"
-            }
+        return {
+            "change_type": "template_improved",
+            "skill_id": skill.id,
+            "detail": "Improved primary response template"
+        }
 
     async def _record_evolution_source(
         self,
+        session: AsyncSession,
         skill_id: str,
         email_id: str,
         contribution_detail: str
-    ):
-        """Record the email as a source for skill evolution"""
-        async with async_session() as session:
-            # Check if already linked
-            existing = await session.execute(
-                select(SkillSourceEmail).where(
+    ) -> Optional[SkillSourceEmail]:
+        """Build a source record for skill evolution unless the email is already linked"""
+        # Check if already linked
+        already_linked = await session.scalar(
+            select(
+                exists().where(
                     SkillSourceEmail.skill_id == skill_id,
                     SkillSourceEmail.email_id == email_id,
                     SkillSourceEmail.contribution_type == "evolution_update"
                 )
             )
+        )
 
-            if not existing.scalar_one_or_none():
-                source = SkillSourceEmail(
-                    id=str(uuid.uuid4()),
-                    skill_id=skill_id,
-                    email_id=email_id,
-                    contribution_type="evolution_update",
-                    contribution_detail=contribution_detail
-                )
-                session.add(source)
-                await session.commit()
+        if already_linked:
+            return None
+
+        return SkillSourceEmail(
+            id=str(uuid.uuid4()),
+            skill_id=skill_id,
+            email_id=email_id,
+            contribution_type="evolution_update",
+            contribution_detail=contribution_detail
+        )
 
 
 # Singleton instance
@@ -2,19 +2,26 @@
 Execution Agent - Processes incoming emails and generates replies
 Phase 2 of the three-phase agent architecture
 """
+import heapq
 import uuid
+from operator import itemgetter
 from typing import Any, Dict, List, Optional
 from datetime import datetime
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, select, update
 
 from agents.base_agent import BaseAgent, AgentResult
 from models.database import Email, Reply, Skill, async_session
 from services.skill_service import SkillService
 from services.email_classifier import EmailClassifierService
+from services.reply_templates import render_template_vars
 from config import settings
 
 
+# Email lookup by primary key, built once and reused (compiled form is cached by the engine)
+_EMAIL_BY_ID = select(Email).where(Email.id == bindparam("email_id"))
+
+
 class ExecutionAgent(BaseAgent):
     """
     Execution Agent - Processes emails and generates AI replies.
@@ -33,6 +40,11 @@ class ExecutionAgent(BaseAgent):
     HIGH_CONFIDENCE_THRESHOLD = 0.7
     ESCALATION_THRESHOLD = 0.3
 
+    # Only the head of the email is scanned for keywords (quoted history adds no signal)
+    MAX_MATCH_CHARS = 8192
+    # Number of best skill matches kept in the result
+    MAX_MATCHED_SKILLS = 10
+
     def __init__(self):
         super().__init__(
             name="ExecutionAgent",
@@ -89,11 +101,13 @@ class ExecutionAgent(BaseAgent):
             self._update_progress(2, 6, "Classifying email...")
             if not email.category:
                 classification = await self._classify_email(email)
-                email = await self._update_email_classification(email_id, classification)
+                email = await self._update_email_classification(email, classification)
 
             # Step 3: Match skills
             self._update_progress(3, 6, "Matching skills...")
-            email_content = f"{email.subject}\n\n{email.body}"
+            subject = email.subject or ""
+            body_budget = max(self.MAX_MATCH_CHARS - len(subject) - 2, 0)
+            email_content = f"{subject}\n\n{(email.body or '')[:body_budget]}"
             matched_skills = await self._match_skills_with_details(
                 email_content,
                 email.category
@@ -110,22 +124,19 @@ class ExecutionAgent(BaseAgent):
                 ai_draft = self._generate_escalation_draft(email)
                 escalation_reason = self._get_escalation_reason(matched_skills, confidence)
             else:
-                ai_draft = await self._generate_reply(email, matched_skills)
+                # Template replies are filled synchronously; Claude only without a template
+                ai_draft = self._fill_template_reply(email, matched_skills)
+                if ai_draft is None:
+                    ai_draft = await self._generate_reply(email, matched_skills)
                 escalation_reason = None
 
-            # Step 6: Save reply
+            # Step 6: Save reply, mark email as processed and count skill usage
             self._update_progress(6, 6, "Saving reply...")
-            reply_id = await self._save_reply(email_id, ai_draft)
-
-            # Update email as processed
-            await self._mark_email_processed(email_id)
-
-            # Increment skill usage
-            if matched_skills and not requires_escalation:
-                await self.skill_service.increment_usage(
-                    matched_skills[0]["skill_id"],
-                    success=True
-                )
+            used_skill_id = (
+                matched_skills[0]["skill_id"]
+                if matched_skills and not requires_escalation else None
+            )
+            reply_id = await self._finalize_email_and_reply(email_id, ai_draft, used_skill_id)
 
             self._end_run("completed")
 
@@ -156,9 +167,7 @@ class ExecutionAgent(BaseAgent):
     async def _get_email(self, email_id: str) -> Optional[Email]:
         """Get email from database"""
         async with async_session() as session:
-            result = await session.execute(
-                select(Email).where(Email.id == email_id)
-            )
+            result = await session.execute(_EMAIL_BY_ID, {"email_id": email_id})
             return result.scalar_one_or_none()
 
     async def _classify_email(self, email: Email) -> Dict[str, Any]:
@@ -171,23 +180,25 @@ class ExecutionAgent(BaseAgent):
 
     async def _update_email_classification(
         self,
-        email_id: str,
+        email: Email,
         classification: Dict[str, Any]
     ) -> Email:
         """Update email with classification results"""
+        is_customer_service = classification.get("is_customer_service", False)
+        category = classification.get("category")
+
         async with async_session() as session:
-            result = await session.execute(
-                select(Email).where(Email.id == email_id)
+            await session.execute(
+                update(Email)
+                .where(Email.id == email.id)
+                .values(is_customer_service=is_customer_service, category=category)
             )
-            email = result.scalar_one_or_none()
-
-            if email:
-                email.is_customer_service = classification.get("is_customer_service", False)
-                email.category = classification.get("category")
-                await session.commit()
-                await session.refresh(email)
+            await session.commit()
 
-            return email
+        # Keep the already-loaded email in sync instead of re-fetching it
+        email.is_customer_service = is_customer_service
+        email.category = category
+        return email
 
     async def _match_skills_with_details(
         self,
@@ -195,23 +206,23 @@ class ExecutionAgent(BaseAgent):
         category: Optional[str]
     ) -> List[Dict[str, Any]]:
         """Match skills and return detailed matching info"""
-        # Get basic matches from skill service
+        # Get basic matches from skill service (cached there by content and skills version)
         basic_matches = await self.skill_service.match_skills(email_content, category)
 
         detailed_matches = []
-        content_lower = email_content.lower()
+
+        # Get full skill info for all matches at once
+        skills_by_id = await self.skill_service.get_skills_by_ids(
+            [match["id"] for match in basic_matches]
+        )
 
         for match in basic_matches:
-            # Get full skill info
-            skill = await self.skill_service.get_skill(match["id"])
+            skill = skills_by_id.get(match["id"])
             if not skill:
                 continue
 
-            # Find which keywords matched
-            matched_keywords = [
-                kw for kw in skill.trigger_keywords
-                if kw.lower() in content_lower
-            ]
+            # Keywords already found by match_skills (no second scan of the content)
+            matched_keywords = match["matched_keywords"]
 
             # Calculate keyword match score
             keyword_score = len(matched_keywords) / max(len(skill.trigger_keywords), 1)
@@ -235,10 +246,10 @@ class ExecutionAgent(BaseAgent):
                 "confidence": skill_confidence
             })
 
-        # Sort by confidence
-        detailed_matches.sort(key=lambda x: x["confidence"], reverse=True)
-
-        return detailed_matches
+        # Sort by confidence, keeping only the top matches
+        return heapq.nlargest(
+            self.MAX_MATCHED_SKILLS, detailed_matches, key=itemgetter("confidence")
+        )
 
     def _calculate_confidence(
         self,
@@ -297,25 +308,32 @@ Customer Support Team"""
         matched_skills: List[Dict]
     ) -> str:
         """Generate reply using matched skill templates or Claude"""
-        customer_name = email.from_name or "Customer"
-
         if not matched_skills:
             return self._generate_escalation_draft(email)
 
-        best_skill = matched_skills[0]
-        matched_rules = best_skill.get("matched_rules", [])
-
         # Try to use template from best matching rule
-        if matched_rules and matched_rules[0].get("response_template"):
-            template = matched_rules[0]["response_template"]
-            reply = template.replace("{{customer_name}}", customer_name)
-            reply = reply.replace("{customer_name}", customer_name)
-            reply = reply.replace("{{company_name}}", "We")
-            reply = reply.replace("{company_name}", "We")
+        reply = self._fill_template_reply(email, matched_skills)
+        if reply is not None:
             return reply
 
         # Generate with Claude if no template
-        return await self._generate_with_claude(email, best_skill)
+        return await self._generate_with_claude(email, matched_skills[0])
+
+    def _fill_template_reply(
+        self,
+        email: Email,
+        matched_skills: List[Dict]
+    ) -> Optional[str]:
+        """Fill the best matching rule's response template, if it has one"""
+        if not matched_skills:
+            return None
+
+        matched_rules = matched_skills[0]["matched_rules"]
+        template = matched_rules[0].get("response_template") if matched_rules else None
+        if not template:
+            return None
+
+        return render_template_vars(template, email.from_name or "Customer")
 
     async def _generate_with_claude(
         self,
@@ -362,34 +380,39 @@ We have reviewed your request and are working on resolving it. Our team will get
 Best regards,
 Customer Support Team"""
 
-    async def _save_reply(self, email_id: str, ai_draft: str) -> str:
-        """Save reply to database"""
+    async def _finalize_email_and_reply(
+        self,
+        email_id: str,
+        ai_draft: str,
+        used_skill_id: Optional[str] = None
+    ) -> str:
+        """Save the reply draft, mark the email processed and count a successful
+        use of the matched skill (if any) in one transaction"""
         reply_id = str(uuid.uuid4())
 
         async with async_session() as session:
-            reply = Reply(
+            session.add(Reply(
                 id=reply_id,
                 email_id=email_id,
                 ai_draft=ai_draft,
                 sent=False
+            ))
+            await session.execute(
+                update(Email).where(Email.id == email_id).values(processed=True)
             )
-            session.add(reply)
+            if used_skill_id:
+                await session.execute(
+                    update(Skill)
+                    .where(Skill.id == used_skill_id)
+                    .values(
+                        usage_count=Skill.usage_count + 1,
+                        success_count=Skill.success_count + 1
+                    )
+                )
             await session.commit()
 
         return reply_id
 
-    async def _mark_email_processed(self, email_id: str):
-        """Mark email as processed"""
-        async with async_session() as session:
-            result = await session.execute(
-                select(Email).where(Email.id == email_id)
-            )
-            email = result.scalar_one_or_none()
-
-            if email:
-                email.processed = True
-                await session.commit()
-
 
 # Singleton instance
 execution_agent = ExecutionAgent()
@@ -2,6 +2,7 @@
 Learning Agent - Analyzes historical emails to create Skills
 Phase 1 of the three-phase agent architecture
 """
+import asyncio
 import json
 import uuid
 from typing import Any, Dict, List, Optional
@@ -11,10 +12,53 @@ from sqlalchemy import select
 
 from agents.base_agent import BaseAgent, AgentResult
 from models.database import Email, Skill, SkillSourceEmail, async_session
+from models.schemas import SkillResponse
 from services.skill_service import SkillService
 from config import settings
 
 
+# Tool used to get the extracted skill back as structured JSON (mirrors SkillCreate / RuleSchema)
+_EXTRACT_SKILL_TOOL = {
+    "name": "extract_skill",
+    "description": "Record the skill extracted from the example emails",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string", "description": "Skill name (Chinese)"},
+            "name_en": {"type": "string", "description": "Skill name in English, kebab-case"},
+            "category": {"type": "string", "description": "The given category"},
+            "description": {"type": "string", "description": "Brief description of what this skill handles"},
+            "trigger_keywords": {"type": "array", "items": {"type": "string"}},
+            "rules": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "rule_id": {"type": "string"},
+                        "name": {"type": "string"},
+                        "trigger_keywords": {"type": "array", "items": {"type": "string"}},
+                        "conditions": {"type": "array", "items": {"type": "string"}},
+                        "action_steps": {"type": "array", "items": {"type": "string"}},
+                        "response_template": {
+                            "type": "string",
+                            "description": "Response template with {{customer_name}} placeholder"
+                        },
+                        "priority": {"type": "integer"}
+                    },
+                    "required": ["rule_id", "name", "response_template", "priority"]
+                }
+            },
+            "collaborative_skills": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "name_en of skills that often work together with this one"
+            }
+        },
+        "required": ["name", "name_en", "category", "trigger_keywords", "rules"]
+    }
+}
+
+
 class LearningAgent(BaseAgent):
     """
     Learning Agent - Extracts patterns from historical emails to create Skills.
@@ -82,25 +126,56 @@ class LearningAgent(BaseAgent):
             self._update_progress(2, 5, "Grouping emails by category...")
             by_category = self._group_by_category(emails, target_categories)
 
-            # Step 3: Extract skills from each category
+            # Existing skills are fetched once and shared by all categories
+            all_skills = await self.skill_service.get_all_skills(active_only=False)
+            existing_by_name_en = {s.name_en: s for s in all_skills}
+
+            # Step 3: Extract skills from each category (Claude calls run
+            # concurrently, bounded; skills are then saved one at a time so
+            # categories returning the same name_en update instead of colliding)
             self._update_progress(3, 5, "Extracting skills from emails...")
             skills_created = 0
             skills_updated = 0
             collaborative_skills = []
+            errors = []
 
             total_categories = len(by_category)
-            for idx, (category, category_emails) in enumerate(by_category.items()):
+            semaphore = asyncio.Semaphore(settings.LEARNING_CONCURRENCY)
+            done = 0
+
+            async def extract(category: str, category_emails: List[Email]) -> Dict[str, Any]:
+                nonlocal done
+                async with semaphore:
+                    result = await self._extract_skill_data(category, category_emails)
+                done += 1
                 self._update_progress(
                     3,
                     5,
-                    f"Processing category {idx + 1}/{total_categories}: {category}"
+                    f"Processed category {done}/{total_categories}: {category}"
                 )
+                return result
 
-                result = await self._extract_skill_from_category(
-                    category,
-                    category_emails,
-                    force
-                )
+            extractions = await asyncio.gather(
+                *[extract(c, e) for c, e in by_category.items()],
+                return_exceptions=True
+            )
+
+            for category, extraction in zip(by_category, extractions):
+                if isinstance(extraction, BaseException):
+                    errors.append(f"{category}: {extraction}")
+                    continue
+
+                try:
+                    result = await self._save_extracted_skill(
+                        category,
+                        by_category[category],
+                        extraction,
+                        force,
+                        existing_by_name_en
+                    )
+                except Exception as e:
+                    errors.append(f"{category}: {e}")
+                    continue
 
                 if result.get("created"):
                     skills_created += 1
@@ -121,6 +196,7 @@ class LearningAgent(BaseAgent):
             return AgentResult(
                 success=True,
                 status="completed",
+                errors=errors,
                 data={
                     "job_id": run_id,
                     "emails_processed": len(emails),
@@ -167,45 +243,60 @@ class LearningAgent(BaseAgent):
             by_category[cat].append(email)
         return by_category
 
-    async def _extract_skill_from_category(
-        self,
-        category: str,
-        emails: List[Email],
-        force: bool
-    ) -> Dict[str, Any]:
-        """Extract skill from a category of emails"""
+    async def _extract_skill_data(self, category: str, emails: List[Email]) -> Dict[str, Any]:
+        """Ask Claude to extract skill data from a category of emails
+
+        Returns:
+            {"skill_data": ...} or {"error": ...}
+        """
         # Prepare email data for analysis (limit to 20 per category)
         conversations = []
-        source_email_ids = []
-
         for email in emails[:20]:
             conversations.append({
                 "from": email.from_address,
                 "subject": email.subject,
                 "body": email.body[:1000]  # Truncate for API
             })
-            source_email_ids.append(email.id)
 
         # Build prompt for Claude
         prompt = self._build_extraction_prompt(category, conversations)
 
-        # Call Claude to extract skill
-        response = await self.call_claude(prompt)
+        # Call Claude to extract skill (the result is streamed back as structured tool input)
+        response = await self.call_claude(
+            prompt,
+            tools=[_EXTRACT_SKILL_TOOL],
+            tool_choice={"type": "tool", "name": "extract_skill"},
+            stream=True
+        )
 
         if not response.get("success"):
             return {"error": response.get("error")}
 
-        # Parse response
-        skill_data = self.extract_json(response.get("content", ""))
-        if not skill_data:
-            return {"error": "Failed to parse skill data from response"}
+        tool_use = response.get("tool_use")
+        if not tool_use:
+            return {"error": "No skill data returned by extract_skill"}
+        return {"skill_data": tool_use.get("input", {})}
+
+    async def _save_extracted_skill(
+        self,
+        category: str,
+        emails: List[Email],
+        extraction: Dict[str, Any],
+        force: bool,
+        existing_by_name_en: Dict[str, SkillResponse]
+    ) -> Dict[str, Any]:
+        """Create (or match an existing) skill from extracted data and record its source emails
+
+        existing_by_name_en maps name_en to skills that already exist; skills
+        created here are added to it.
+        """
+        if "error" in extraction:
+            return extraction
+        skill_data = extraction["skill_data"]
+        source_email_ids = [email.id for email in emails[:20]]
 
         # Check if skill already exists
-        existing_skills = await self.skill_service.get_all_skills(active_only=False)
-        existing_skill = next(
-            (s for s in existing_skills if s.name_en == skill_data.get("name_en")),
-            None
-        )
+        existing_skill = existing_by_name_en.get(skill_data.get("name_en"))
 
         result = {
             "category": category,
@@ -246,6 +337,8 @@ class LearningAgent(BaseAgent):
             new_skill = await self.skill_service.create_skill(skill_create)
             result["created"] = True
             result["skill_id"] = new_skill.id if new_skill else None
+            if new_skill:
+                existing_by_name_en[new_skill.name_en] = new_skill
 
         # Record source emails
         if result.get("skill_id") and source_email_ids:
@@ -301,7 +394,7 @@ Guidelines:
 3. Priority: higher number = more specific rule (10-100)
 4. Identify skills that might work together (e.g., "refund" often relates to "logistics")
 
-Only return the JSON, nothing else."""
+Report the skill with the extract_skill tool."""
 
     async def _record_source_emails(
         self,
@@ -311,23 +404,27 @@ Only return the JSON, nothing else."""
     ):
         """Record source emails for a skill"""
         async with async_session() as session:
-            for email_id in email_ids:
-                # Check if link already exists
-                existing = await session.execute(
-                    select(SkillSourceEmail).where(
-                        SkillSourceEmail.skill_id == skill_id,
-                        SkillSourceEmail.email_id == email_id
-                    )
+            # Find which links already exist in one query
+            existing = await session.execute(
+                select(SkillSourceEmail.email_id).where(
+                    SkillSourceEmail.skill_id == skill_id,
+                    SkillSourceEmail.email_id.in_(email_ids)
                 )
-                if not existing.scalar_one_or_none():
-                    source_record = SkillSourceEmail(
-                        id=str(uuid.uuid4()),
-                        skill_id=skill_id,
-                        email_id=email_id,
-                        contribution_type="initial_learning",
-                        contribution_detail=f"Used for learning category: {category}"
-                    )
-                    session.add(source_record)
+            )
+            existing_ids = set(existing.scalars().all())
+
+            contribution_detail = f"Used for learning category: {category}"
+            session.add_all([
+                SkillSourceEmail(
+                    id=str(uuid.uuid4()),
+                    skill_id=skill_id,
+                    email_id=email_id,
+                    contribution_type="initial_learning",
+                    contribution_detail=contribution_detail
+                )
+                for email_id in dict.fromkeys(email_ids)
+                if email_id not in existing_ids
+            ])
             await session.commit()
 
 
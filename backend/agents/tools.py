@@ -2,20 +2,101 @@
 Agent Tools - Define tools for EmailAssistantAgent
 Using Claude Agent SDK's @tool decorator
 """
-from typing import Dict, List, Optional, Any
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Optional, Any
+
+import orjson
 from claude_agent_sdk import tool
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from agents.base_agent import BaseAgent
+from config import settings
+from models.database import Email, Reply, Skill, async_session
+from services.email_classifier import EmailClassifierService
+from services.skill_service import SkillService
+from services.reply_templates import render_template_vars
 
 
-# Database session and services will be injected
-_db_session = None
-_skill_service = None
+# Database session and services will be injected per task/request (never shared
+# across concurrent requests: an AsyncSession is not safe to use from several tasks)
+_db_session_var: ContextVar[Optional[Any]] = ContextVar("db_session", default=None)
+_skill_service_var: ContextVar[Optional[Any]] = ContextVar("skill_service", default=None)
+_default_skill_service = None
+
+# Rendered get_skills text: (skills version, rendered at, text)
+_skills_text_cache: Optional[tuple] = None
+_SKILLS_CACHE_TTL = 60.0  # seconds
 
 
 def set_services(db_session, skill_service):
-    """Set service instances for tools to use"""
-    global _db_session, _skill_service
-    _db_session = db_session
-    _skill_service = skill_service
+    """Set service instances for tools to use in the current context
+
+    Returns tokens that can be passed to reset_services().
+    """
+    return _db_session_var.set(db_session), _skill_service_var.set(skill_service)
+
+
+def reset_services(tokens):
+    """Restore the services that were set before set_services()"""
+    db_token, skill_token = tokens
+    _db_session_var.reset(db_token)
+    _skill_service_var.reset(skill_token)
+
+
+@asynccontextmanager
+async def _session_scope():
+    """Use the injected DB session if there is one, otherwise a new session"""
+    session = _db_session_var.get()
+    if session is not None:
+        yield session
+        return
+    
+    async with async_session() as session:
+        yield session
+
+
+def _get_skill_service():
+    """Get the injected SkillService, or a shared default instance"""
+    global _default_skill_service
+    skill_service = _skill_service_var.get()
+    if skill_service is not None:
+        return skill_service
+    if _default_skill_service is None:
+        _default_skill_service = SkillService()
+    return _default_skill_service
+
+
+def _select_email_preview(length: int):
+    """Select the email fields tools show, with only the first `length` characters of the body
+
+    Only the needed columns are projected and the body is cut in SQL, so long
+    bodies and JSON address lists never leave the database. Rows have the
+    attributes id, from_name, from_address, subject, category,
+    is_customer_service and body_preview.
+    """
+    
+    return select(
+        Email.id,
+        Email.from_name,
+        Email.from_address,
+        Email.subject,
+        Email.category,
+        Email.is_customer_service,
+        func.substr(Email.body, 1, length).label("body_preview")
+    )
+
+
+@lru_cache(maxsize=None)
+def _email_preview_by_id(length: int):
+    """Email preview lookup by ID (bind parameter "email_id"), built once per length"""
+    
+    return _select_email_preview(length).where(Email.id == bindparam("email_id"))
 
 
 @tool("get_email", "Get email details by ID", {
@@ -23,16 +104,12 @@ def set_services(db_session, skill_service):
 })
 async def get_email(args: Dict[str, Any]) -> Dict[str, Any]:
     """Get email details from database"""
-    from models.database import Email, async_session
-    from sqlalchemy import select
     
     email_id = args.get("email_id")
     
-    async with async_session() as session:
-        result = await session.execute(
-            select(Email).where(Email.id == email_id)
-        )
-        email = result.scalar_one_or_none()
+    async with _session_scope() as session:
+        result = await session.execute(_email_preview_by_id(2000), {"email_id": email_id})
+        email = result.one_or_none()
         
         if not email:
             return {
@@ -52,17 +129,61 @@ async def get_email(args: Dict[str, Any]) -> Dict[str, Any]:
 - Category: {email.category or 'Not classified'}
 - Is Customer Service: {email.is_customer_service}
 - Body:
-{email.body[:2000]}"""
+{email.body_preview}"""
             }]
         }
 
 
+@tool("get_emails", "Get details of several emails by ID in one call (prefer over repeated get_email)", {
+    "email_ids": list
+})
+async def get_emails(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Get details of multiple emails from database in a single query"""
+    
+    email_ids = list(dict.fromkeys(args.get("email_ids") or []))
+    
+    async with _session_scope() as session:
+        result = await session.execute(
+            _select_email_preview(2000).where(Email.id.in_(email_ids))
+        )
+        emails = {email.id: email for email in result.all()}
+    
+    sections = []
+    for email_id in email_ids:
+        if email_id not in emails:
+            sections.append(f"Error: Email with ID {email_id} not found")
+            continue
+        email = emails[email_id]
+        sections.append(f"""Email Details:
+- ID: {email.id}
+- From: {email.from_name} <{email.from_address}>
+- Subject: {email.subject}
+- Category: {email.category or 'Not classified'}
+- Is Customer Service: {email.is_customer_service}
+- Body:
+{email.body_preview}""")
+    
+    return {
+        "content": [{
+            "type": "text",
+            "text": "\n\n---\n\n".join(sections) if sections else "No email IDs given"
+        }]
+    }
+
+
 @tool("get_skills", "Get all available skills from the database", {})
 async def get_skills(args: Dict[str, Any]) -> Dict[str, Any]:
     """Get all skills from database"""
-    from services.skill_service import SkillService
+    global _skills_text_cache
     
-    skill_service = SkillService()
+    # Reuse the rendered list until skills change or the TTL expires
+    if _skills_text_cache:
+        version, rendered_at, text = _skills_text_cache
+        if version == SkillService.version and time.monotonic() - rendered_at < _SKILLS_CACHE_TTL:
+            return {"content": [{"type": "text", "text": text}]}
+    
+    version = SkillService.version
+    skill_service = _get_skill_service()
     skills = await skill_service.get_all_skills()
     
     if not skills:
@@ -77,11 +198,13 @@ async def get_skills(args: Dict[str, Any]) -> Dict[str, Any]:
         f"- {s.name} ({s.name_en}): {s.description or 'No description'} | Keywords: {', '.join(s.trigger_keywords or [])}"
         for s in skills
     ])
+    text = f"Available Skills ({len(skills)} total):\n{skills_text}"
+    _skills_text_cache = (version, time.monotonic(), text)
     
     return {
         "content": [{
             "type": "text",
-            "text": f"Available Skills ({len(skills)} total):\n{skills_text}"
+            "text": text
         }]
     }
 
@@ -92,12 +215,10 @@ async def get_skills(args: Dict[str, Any]) -> Dict[str, Any]:
 })
 async def match_skill(args: Dict[str, Any]) -> Dict[str, Any]:
     """Match skills to email content"""
-    from services.skill_service import SkillService
-    
     email_content = args.get("email_content", "")
     category = args.get("category")
     
-    skill_service = SkillService()
+    skill_service = _get_skill_service()
     matched = await skill_service.match_skills(email_content, category)
     
     if not matched:
@@ -129,13 +250,10 @@ Rules:
 })
 async def get_skill_template(args: Dict[str, Any]) -> Dict[str, Any]:
     """Get response template from a skill"""
-    from services.skill_service import SkillService
-    from models.database import Skill, async_session
-    from sqlalchemy import select
     
     skill_name_en = args.get("skill_name_en")
     
-    async with async_session() as session:
+    async with _session_scope() as session:
         result = await session.execute(
             select(Skill).where(Skill.name_en == skill_name_en)
         )
@@ -177,17 +295,11 @@ async def get_skill_template(args: Dict[str, Any]) -> Dict[str, Any]:
 })
 async def classify_email(args: Dict[str, Any]) -> Dict[str, Any]:
     """Classify email using AI"""
-    from models.database import Email, async_session
-    from services.email_classifier import EmailClassifierService
-    from sqlalchemy import select
     
     email_id = args.get("email_id")
     
-    async with async_session() as session:
-        result = await session.execute(
-            select(Email).where(Email.id == email_id)
-        )
-        email = result.scalar_one_or_none()
+    async with _session_scope() as session:
+        email = await session.get(Email, email_id)
         
         if not email:
             return {
@@ -197,28 +309,104 @@ async def classify_email(args: Dict[str, Any]) -> Dict[str, Any]:
                 }]
             }
         
-        classifier = EmailClassifierService()
-        classification = await classifier.classify_email({
+        email_data = {
             "from_address": email.from_address,
             "subject": email.subject,
             "body": email.body
-        })
-        
-        # Update email
-        email.is_customer_service = classification.get("is_customer_service", False)
-        email.category = classification.get("category")
+        }
+    
+    # Classify without holding a DB connection during the Claude call
+    classifier = EmailClassifierService()
+    classification = await classifier.classify_email(email_data)
+    
+    # Update email
+    async with _session_scope() as session:
+        await session.execute(
+            update(Email)
+            .where(Email.id == email_id)
+            .values(
+                is_customer_service=classification.get("is_customer_service", False),
+                category=classification.get("category")
+            )
+        )
         await session.commit()
-        
-        return {
-            "content": [{
-                "type": "text",
-                "text": f"""Email Classification Result:
+    
+    return {
+        "content": [{
+            "type": "text",
+            "text": f"""Email Classification Result:
 - Is Customer Service: {classification.get('is_customer_service')}
 - Category: {classification.get('category')}
 - Confidence: {classification.get('confidence')}
 - Reasoning: {classification.get('reasoning')}"""
-            }]
+        }]
+    }
+
+
+@tool("classify_emails", "Classify several emails concurrently (prefer over repeated classify_email)", {
+    "email_ids": list
+})
+async def classify_emails(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Classify multiple emails using AI, with bounded concurrency"""
+    
+    email_ids = list(dict.fromkeys(args.get("email_ids") or []))
+    
+    async with _session_scope() as session:
+        result = await session.execute(
+            select(Email.id, Email.from_address, Email.subject, Email.body)
+            .where(Email.id.in_(email_ids))
+        )
+        emails = {
+            row.id: {"from_address": row.from_address, "subject": row.subject, "body": row.body}
+            for row in result.all()
         }
+    
+    # Classify without holding a DB connection; limit in-flight Claude calls
+    classifier = EmailClassifierService()
+    semaphore = asyncio.Semaphore(settings.ANTHROPIC_MAX_CONCURRENCY)
+    
+    async def classify_one(email_data: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            return await classifier.classify_email(email_data)
+    
+    classifications = dict(zip(
+        emails,
+        await asyncio.gather(*[classify_one(data) for data in emails.values()])
+    ))
+    
+    # Persist all results with one executemany UPDATE (by primary key)
+    if classifications:
+        async with _session_scope() as session:
+            await session.execute(
+                update(Email),
+                [
+                    {
+                        "id": email_id,
+                        "is_customer_service": c.get("is_customer_service", False),
+                        "category": c.get("category")
+                    }
+                    for email_id, c in classifications.items()
+                ]
+            )
+            await session.commit()
+    
+    lines = []
+    for email_id in email_ids:
+        c = classifications.get(email_id)
+        if c is None:
+            lines.append(f"- {email_id}: not found")
+        else:
+            lines.append(
+                f"- {email_id}: customer_service={c.get('is_customer_service')}, "
+                f"category={c.get('category')}, confidence={c.get('confidence')}"
+            )
+    
+    return {
+        "content": [{
+            "type": "text",
+            "text": f"Email Classification Results ({len(classifications)} classified):\n" + "\n".join(lines)
+        }]
+    }
 
 
 @tool("generate_reply", "Generate a reply for an email using a template or AI", {
@@ -228,20 +416,14 @@ async def classify_email(args: Dict[str, Any]) -> Dict[str, Any]:
 })
 async def generate_reply(args: Dict[str, Any]) -> Dict[str, Any]:
     """Generate reply using template or AI"""
-    from models.database import Email, async_session
-    from sqlalchemy import select
-    import httpx
-    from config import settings
     
     email_id = args.get("email_id")
     template = args.get("template", "")
     customer_name = args.get("customer_name", "Customer")
     
-    async with async_session() as session:
-        result = await session.execute(
-            select(Email).where(Email.id == email_id)
-        )
-        email = result.scalar_one_or_none()
+    async with _session_scope() as session:
+        result = await session.execute(_email_preview_by_id(1500), {"email_id": email_id})
+        email = result.one_or_none()
         
         if not email:
             return {
@@ -253,8 +435,8 @@ async def generate_reply(args: Dict[str, Any]) -> Dict[str, Any]:
     
     # If template provided, use it
     if template:
-        reply = template.replace("{{customer_name}}", customer_name)
-        reply = reply.replace("{customer_name}", customer_name)
+        # One pass over the template; unknown placeholders are left as-is
+        reply = render_template_vars(template, customer_name)
         return {
             "content": [{
                 "type": "text",
@@ -276,7 +458,7 @@ async def generate_reply(args: Dict[str, Any]) -> Dict[str, Any]:
 Original Email:
 From: {email.from_name} <{email.from_address}>
 Subject: {email.subject}
-Body: {email.body[:1500]}
+Body: {email.body_preview}
 
 Generate a helpful, professional reply. Be concise and friendly. Only return the email content."""
 
@@ -287,11 +469,14 @@ Generate a helpful, professional reply. Be concise and friendly. Only return the
     }
     
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(api_url, headers=headers, json=data)
+        # Shared keep-alive client (closed on app shutdown)
+        client = BaseAgent.get_client()
+        response = await client.post(
+            api_url, headers=headers, content=orjson.dumps(data), timeout=30
+        )
         
         if response.status_code == 200:
-            result_json = response.json()
+            result_json = orjson.loads(response.content)
             reply_text = result_json["content"][0]["text"]
             return {
                 "content": [{
@@ -316,13 +501,11 @@ Generate a helpful, professional reply. Be concise and friendly. Only return the
 })
 async def save_reply(args: Dict[str, Any]) -> Dict[str, Any]:
     """Save reply to database"""
-    from models.database import Reply, async_session
-    import uuid
     
     email_id = args.get("email_id")
     reply_content = args.get("reply_content")
     
-    async with async_session() as session:
+    async with _session_scope() as session:
         reply = Reply(
             id=str(uuid.uuid4()),
             email_id=email_id,
@@ -340,13 +523,85 @@ async def save_reply(args: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
+@tool("save_replies", "Save several reply drafts to the database at once (prefer over repeated save_reply)", {
+    "replies": list
+})
+async def save_replies(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Save multiple replies to database in one transaction"""
+    
+    valid = []
+    skipped = []
+    for index, entry in enumerate(args.get("replies") or []):
+        if isinstance(entry, dict) and isinstance(entry.get("email_id"), str) and entry["email_id"]:
+            valid.append(entry)
+        else:
+            skipped.append(f"- entry {index}: missing email_id")
+    
+    if not valid:
+        return {
+            "content": [{
+                "type": "text",
+                "text": "\n".join(["Error: No valid replies given"] + skipped)
+            }]
+        }
+    
+    try:
+        async with _session_scope() as session:
+            result = await session.execute(
+                select(Email.id).where(Email.id.in_({entry["email_id"] for entry in valid}))
+            )
+            existing_ids = set(result.scalars().all())
+            
+            rows = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "email_id": entry["email_id"],
+                    "ai_draft": entry.get("reply_content"),
+                    "sent": False
+                }
+                for entry in valid
+                if entry["email_id"] in existing_ids
+            ]
+            skipped.extend(
+                f"- {entry['email_id']}: email not found"
+                for entry in valid
+                if entry["email_id"] not in existing_ids
+            )
+            
+            if rows:
+                await session.execute(insert(Reply), rows)
+                await session.commit()
+    except SQLAlchemyError as e:
+        return {
+            "content": [{
+                "type": "text",
+                "text": f"Error: Failed to save replies: {e}"
+            }]
+        }
+    
+    lines = [f"Saved {len(rows)} replies successfully with IDs: " + ", ".join(r["id"] for r in rows)]
+    if skipped:
+        lines.append(f"Skipped {len(skipped)} entries:")
+        lines.extend(skipped)
+    
+    return {
+        "content": [{
+            "type": "text",
+            "text": "\n".join(lines)
+        }]
+    }
+
+
 # Export all tools for MCP server
 ALL_TOOLS = [
     get_email,
+    get_emails,
     get_skills,
     match_skill,
     get_skill_template,
     classify_email,
+    classify_emails,
     generate_reply,
-    save_reply
+    save_reply,
+    save_replies
 ]
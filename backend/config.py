@@ -21,9 +21,17 @@ class Settings(BaseSettings):
     # Claude API
     ANTHROPIC_API_KEY: Optional[str] = None
     ANTHROPIC_BASE_URL: str = "https://api.anthropic.com/v1"
+    ANTHROPIC_MAX_CONCURRENCY: int = 8  # Max in-flight Claude requests from agents
 
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./data/emails.db"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_QUERY_CACHE_SIZE: int = 1200  # Compiled SQL statement cache entries
+
+    # Logging
+    LOG_LEVEL: str = "INFO"  # Set to DEBUG for per-email/per-request details
 
     # Frontend URL for CORS
     FRONTEND_URL: str = "http://localhost:3000"
@@ -38,6 +46,8 @@ class Settings(BaseSettings):
 
     # Learning settings
     LEARN_EMAIL_COUNT: int = 100
+    LEARNING_CONCURRENCY: int = 5  # Categories extracted in parallel
+    BATCH_EXECUTE_CONCURRENCY: int = 8  # Emails processed in parallel by /api/agents/batch-execute
 
     class Config:
         env_file = ".env"
@@ -2,6 +2,9 @@
 FastAPI Main Application for MailMind AI
 """
 import asyncio
+import logging
+import logging.handlers
+import queue
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,20 +17,46 @@ from routers.replies_router import replies_router
 from routers.status_router import status_router
 from routers.oauth_router import oauth_router
 from routers.agents_router import agents_router
-from routers.agents_router import agents_router
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Send log records through a queue; a listener thread does the stream writes
+
+    Handlers never write to stdout on the event loop, so a slow terminal or
+    pipe can't stall request handling.
+    """
+    log_queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(settings.LOG_LEVEL)
+    root_logger.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager"""
     # Startup
+    log_listener = setup_logging()
     from models.database import init_db
+    from services.skill_service import SkillService
     await init_db()
+    await SkillService().warm_keyword_indexes()
     print("🚀 MailMind AI Backend Started!")
     print(f"📧 Zoho Email: {settings.ZOHO_EMAIL}")
     yield
     # Shutdown
+    from agents.base_agent import BaseAgent
+    await BaseAgent.aclose()
     print("👋 MailMind AI Backend Shutting down...")
+    log_listener.stop()
 
 
 # Create FastAPI app
@@ -41,12 +70,13 @@ app = FastAPI(
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
+    # A set, so origin checks are a hash lookup rather than a list scan
+    allow_origins=frozenset({
         settings.FRONTEND_URL,
         "http://localhost:3000",
         "http://localhost:3001",
         "http://localhost:3002",
-    ],
+    }),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -59,7 +89,6 @@ app.include_router(replies_router, prefix="/api/replies", tags=["replies"])
 app.include_router(status_router, prefix="/api/status", tags=["status"])
 app.include_router(oauth_router, prefix="/api/oauth", tags=["oauth"])
 app.include_router(agents_router, prefix="/api/agents", tags=["agents"])
-app.include_router(agents_router, prefix="/api/agents", tags=["agents"])
 
 
 @app.get("/")
@@ -2,18 +2,57 @@
 Database models and initialization
 """
 from datetime import datetime
+from functools import cached_property
 from typing import Optional
-from sqlalchemy import String, Boolean, Integer, Text, JSON, DateTime, ForeignKey
+from sqlalchemy import String, Boolean, Integer, Text, JSON, DateTime, ForeignKey, Index, event, inspect
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import settings
 
+
+def _engine_pool_options(database_url: str) -> dict:
+    """连接池参数（内存 SQLite 保持默认连接池）"""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": 30,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=False,
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    **_engine_pool_options(settings.DATABASE_URL),
 )
 
+# SQLite 连接参数：WAL 允许读写并发，synchronous=NORMAL 在 WAL 下仍然安全且减少 fsync
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """每个新连接设置 SQLite PRAGMA"""
+        cursor = dbapi_connection.cursor()
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
 # Create async session factory
 async_session = async_sessionmaker(
     engine,
@@ -30,6 +69,12 @@ class Base(DeclarativeBase):
 class Email(Base):
     """Email model"""
     __tablename__ = "emails"
+    __table_args__ = (
+        # 常用筛选：客服邮件 + 处理状态
+        Index("ix_emails_cs_processed", "is_customer_service", "processed"),
+        # 邮件列表按 (received_at, id) 倒序分页（keyset 分页）
+        Index("ix_emails_received_at_id", "received_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     zoho_id: Mapped[str] = mapped_column(String, unique=True, index=True)
@@ -40,19 +85,19 @@ class Email(Base):
     cc_addresses: Mapped[list] = mapped_column(JSON, default=list)  # 抄送人列表
     subject: Mapped[str] = mapped_column(String)
     body: Mapped[str] = mapped_column(Text)
-    received_at: Mapped[datetime] = mapped_column(DateTime)
+    received_at: Mapped[datetime] = mapped_column(DateTime, index=True)
     is_customer_service: Mapped[bool] = mapped_column(Boolean, default=False)
-    category: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    processed: Mapped[bool] = mapped_column(Boolean, default=False)
+    category: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
+    processed: Mapped[bool] = mapped_column(Boolean, default=False, index=True)
     
     # Priority fields - 重点关注邮件
     is_priority: Mapped[bool] = mapped_column(Boolean, default=False, index=True)
     priority_score: Mapped[int] = mapped_column(Integer, default=0)  # 0-100
     priority_reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
-    # Relationship
+    # Relationship (never lazy-loaded: use options(selectinload(Email.replies)) when needed)
     replies: Mapped[list["Reply"]] = relationship(
-        "Reply", back_populates="email", cascade="all, delete-orphan"
+        "Reply", back_populates="email", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
 
 
@@ -61,10 +106,10 @@ class Reply(Base):
     __tablename__ = "replies"
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
-    email_id: Mapped[str] = mapped_column(String, ForeignKey("emails.id"))
+    email_id: Mapped[str] = mapped_column(String, ForeignKey("emails.id"), index=True)
     ai_draft: Mapped[str] = mapped_column(Text)
     human_edited: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    sent: Mapped[bool] = mapped_column(Boolean, default=False)
+    sent: Mapped[bool] = mapped_column(Boolean, default=False, index=True)
     sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
@@ -89,11 +134,23 @@ class Skill(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    # Relationship to source emails
+    # Relationship to source emails (never lazy-loaded: use options(selectinload(Skill.source_emails)) when needed)
     source_emails: Mapped[list["SkillSourceEmail"]] = relationship(
-        "SkillSourceEmail", back_populates="skill", cascade="all, delete-orphan"
+        "SkillSourceEmail", back_populates="skill", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
 
+    @cached_property
+    def trigger_keywords_lc(self) -> set:
+        """Lowercased trigger keywords (not persisted; add to it when adding keywords)"""
+        return {kw.lower() for kw in self.trigger_keywords or []}
+
+
+@event.listens_for(Skill, "expire")
+@event.listens_for(Skill, "refresh")
+def _clear_skill_cached_properties(target, *args):
+    """Skill 被 expire / refresh 后清除派生缓存，避免使用过期的关键词"""
+    target.__dict__.pop("trigger_keywords_lc", None)
+
 
 class SkillSourceEmail(Base):
     """
@@ -145,8 +202,100 @@ class SkillChangeLog(Base):
     triggered_by_reply: Mapped[Optional["Reply"]] = relationship("Reply")
 
 
+class ClassificationCache(Base):
+    """
+    邮件分类结果缓存
+    以邮件内容哈希为键，避免对相同邮件重复调用 Claude 分类
+    """
+    __tablename__ = "classification_cache"
+
+    # 内容哈希 (from_address + subject + body)
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+
+    # 分类结果: {"is_customer_service": ..., "category": ..., "confidence": ..., "reasoning": ...}
+    result: Mapped[dict] = mapped_column(JSON, default=dict)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class PriorityCache(Base):
+    """
+    邮件优先级分析结果缓存
+    以邮件内容哈希为键，相同内容的邮件（通知、订单确认等）不再重复调用 Claude
+    """
+    __tablename__ = "priority_cache"
+
+    # 内容哈希 (from_address + subject + body[:500])
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+
+    # 分析结果: {"is_priority": ..., "score": ..., "reason": ...}
+    result: Mapped[dict] = mapped_column(JSON, default=dict)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class AgentJob(Base):
+    """
+    后台 Agent 任务（学习、批量执行）的状态
+    保存在数据库中，多个 worker 进程共享，进程重启后仍可查询
+    """
+    __tablename__ = "agent_jobs"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+
+    # 任务类型: learning, batch_execution
+    agent: Mapped[str] = mapped_column(String)
+
+    # 状态: started, completed, partial, failed
+    status: Mapped[str] = mapped_column(String, default="started")
+
+    # 批量执行的邮件总数（学习任务为空）
+    total: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    # 学习任务的结果和错误信息
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    errors: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class AgentJobResult(Base):
+    """
+    批量执行任务中单封邮件的处理结果
+    每处理完一封邮件插入一行，进度 = 行数，不需要改写整个结果列表
+    """
+    __tablename__ = "agent_job_results"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job_id: Mapped[str] = mapped_column(String, ForeignKey("agent_jobs.id"), index=True)
+
+    # 该邮件在请求中的位置（结果按提交顺序返回，与完成顺序无关）
+    position: Mapped[int] = mapped_column(Integer)
+
+    # {"email_id": ..., "success": ..., "status": ..., "reply_id": ...} 或 {"email_id": ..., "success": False, "error": ...}
+    result: Mapped[dict] = mapped_column(JSON, default=dict)
+
+
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_missing_schema)
+
+
+def _create_missing_schema(conn):
+    """只在有缺失的表时执行 create_all，并为已存在的表补建新增的索引"""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    if not existing_tables.issuperset(Base.metadata.tables):
+        Base.metadata.create_all(conn)
+
+    # create_all 不会给已存在的表补建索引：每张表查询一次已有索引，只创建缺失的
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # 刚由 create_all 创建，索引已齐全
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(conn)
 
@@ -1,9 +1,15 @@
 """
 Pydantic schemas for API requests/responses
 """
+import re
 from datetime import datetime
 from typing import Optional, List
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+# Config for models only used as a route's response_model: their validator is
+# built on first use (route registration) instead of when this module is imported
+RESPONSE_ONLY_CONFIG = ConfigDict(defer_build=True)
 
 
 # ==================== Email Schemas ====================
@@ -37,8 +43,7 @@ class EmailResponse(EmailBase):
     priority_score: int = 0
     priority_reason: Optional[str] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class EmailListResponse(BaseModel):
@@ -48,6 +53,10 @@ class EmailListResponse(BaseModel):
     pending: int
     processed: int
     priority: int = 0
+    # Keyset cursor for the next page: {"before": received_at, "before_id": id}
+    next_cursor: Optional[dict] = None
+
+    model_config = RESPONSE_ONLY_CONFIG
 
 
 # ==================== Reply Schemas ====================
@@ -69,8 +78,7 @@ class ReplyResponse(BaseModel):
     sent_at: Optional[datetime] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class GenerateReplyRequest(BaseModel):
@@ -140,8 +148,13 @@ class SkillResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_validator("trigger_keywords", "rules", mode="before")
+    @classmethod
+    def _none_as_empty(cls, value):
+        """JSON columns may be NULL"""
+        return [] if value is None else value
 
 
 class SkillListResponse(BaseModel):
@@ -150,6 +163,8 @@ class SkillListResponse(BaseModel):
     total: int
     categories: List[str]
 
+    model_config = RESPONSE_ONLY_CONFIG
+
 
 # ==================== Learn Schemas ====================
 
@@ -180,14 +195,28 @@ class StatusResponse(BaseModel):
     total_skills: int
     pending_replies: int
 
+    model_config = RESPONSE_ONLY_CONFIG
+
 
 # ==================== Zoho Config Schemas ====================
 
+# Basic shape check only (no DNS / IDNA handling needed for a config form)
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
 class ZohoConfigRequest(BaseModel):
     """Schema for Zoho configuration"""
-    email: EmailStr
+    email: str
     app_password: str
 
+    @field_validator("email")
+    @classmethod
+    def _check_email(cls, value):
+        """Reject values that are not shaped like an email address"""
+        if not _EMAIL_RE.match(value):
+            raise ValueError("value is not a valid email address")
+        return value
+
 
 class ZohoConfigResponse(BaseModel):
     """Schema for Zoho configuration response"""
@@ -256,6 +285,8 @@ class AgentExecuteResponse(BaseModel):
     requires_escalation: bool = False
     escalation_reason: Optional[str] = None
 
+    model_config = RESPONSE_ONLY_CONFIG
+
 
 class AgentEvolveRequest(BaseModel):
     """Schema for agent evolution request"""
@@ -277,6 +308,8 @@ class AgentEvolveResponse(BaseModel):
     changes: List[SkillChange] = []
     message: str
 
+    model_config = RESPONSE_ONLY_CONFIG
+
 
 class AgentInfo(BaseModel):
     """Schema for agent info"""
@@ -292,3 +325,37 @@ class AgentStatusResponse(BaseModel):
     agents: dict  # {"learning": AgentInfo, "execution": AgentInfo, "evolution": AgentInfo}
     skill_library: dict  # {"total_skills": int, "active_skills": int, "categories": int}
     email_stats: dict  # {"total_emails": int, "customer_service": int, "processed": int}
+
+    model_config = RESPONSE_ONLY_CONFIG
+
+
+class AgentJobStatusResponse(BaseModel):
+    """Schema for background job status (only the fields the job has set are returned)"""
+    job_id: str
+    status: str  # "started", "completed", "partial", "failed"
+    agent: Optional[str] = None  # "learning", "batch_execution"
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    total: Optional[int] = None
+    completed: Optional[int] = None
+    result: Optional[dict] = None
+    results: Optional[List[dict]] = None
+    errors: Optional[List[str]] = None
+
+    model_config = RESPONSE_ONLY_CONFIG
+
+
+class AgentBatchExecuteRequest(BaseModel):
+    """Schema for batch execution request (size-capped so oversized batches are rejected up front)"""
+    email_ids: List[str] = Field(..., max_length=1000)
+
+    model_config = ConfigDict(str_max_length=64)
+
+
+class AgentBatchExecuteResponse(BaseModel):
+    """Schema for batch execution response"""
+    job_id: str
+    status: str
+    message: str
+
+    model_config = RESPONSE_ONLY_CONFIG
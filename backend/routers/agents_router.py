@@ -2,11 +2,16 @@
 Agents router - API endpoints for agent operations
 Provides unified access to Learning, Execution, and Evolution agents
 """
-import uuid
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Optional
+import orjson
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Response
 from sqlalchemy import select, func
 
+from config import settings
 from models.database import Email, Skill, Reply, async_session
 from models.schemas import (
     AgentLearnRequest,
@@ -16,18 +21,37 @@ from models.schemas import (
     AgentEvolveRequest,
     AgentEvolveResponse,
     AgentStatusResponse,
-    MatchedSkillDetail,
-    SkillChange
+    AgentJobStatusResponse,
+    AgentBatchExecuteRequest,
+    AgentBatchExecuteResponse
 )
 from agents.learning_agent import learning_agent
 from agents.execution_agent import execution_agent
 from agents.evolution_agent import evolution_agent
+from services.job_service import job_service
+from services.skill_service import SkillService
 
 
+logger = logging.getLogger(__name__)
+
+# Every endpoint declares a response_model so FastAPI serializes straight to
+# JSON bytes with pydantic-core, instead of jsonable_encoder + json.dumps
 agents_router = APIRouter()
 
-# Track background jobs
-_background_jobs = {}
+# Counts shown by /status: (skills version, computed_at, (skill_library, email_stats))
+_stats_cache: Optional[tuple] = None
+_STATS_CACHE_TTL = 3.0  # seconds
+
+
+def _json_response(data: dict) -> Response:
+    """
+    Return an already-serialized JSON response.
+
+    FastAPI passes Response objects through untouched, so the endpoint's
+    response_model is only used for the OpenAPI schema and the payload is not
+    re-validated or re-encoded.
+    """
+    return Response(content=orjson.dumps(data), media_type="application/json")
 
 
 @agents_router.post("/learn", response_model=AgentLearnResponse)
@@ -41,14 +65,8 @@ async def trigger_learning(
     The learning process runs in the background. Use the returned job_id
     to check status via GET /api/agents/status.
     """
-    job_id = str(uuid.uuid4())
-
-    # Store job status
-    _background_jobs[job_id] = {
-        "status": "started",
-        "started_at": datetime.utcnow(),
-        "agent": "learning"
-    }
+    # Store job status (in the database, so any worker can report it)
+    job_id = await job_service.create_job("learning")
 
     # Run learning in background
     background_tasks.add_task(
@@ -74,18 +92,14 @@ async def _run_learning_background(job_id: str, email_count: int, force: bool):
             "force": force
         })
 
-        _background_jobs[job_id] = {
-            "status": result.status,
-            "completed_at": datetime.utcnow(),
-            "result": result.data,
-            "errors": result.errors
-        }
+        await job_service.finish_job(
+            job_id,
+            result.status,
+            result=result.data,
+            errors=result.errors
+        )
     except Exception as e:
-        _background_jobs[job_id] = {
-            "status": "failed",
-            "completed_at": datetime.utcnow(),
-            "errors": [str(e)]
-        }
+        await job_service.finish_job(job_id, "failed", errors=[str(e)])
 
 
 @agents_router.post("/execute", response_model=AgentExecuteResponse)
@@ -116,28 +130,28 @@ async def execute_email(request: AgentExecuteRequest):
 
     # Convert matched skills to response format
     matched_skills = [
-        MatchedSkillDetail(
-            skill_id=s.get("skill_id", ""),
-            skill_name=s.get("skill_name", ""),
-            skill_name_en=s.get("skill_name_en", ""),
-            category=s.get("category", ""),
-            matched_keywords=s.get("matched_keywords", []),
-            matched_rules=s.get("matched_rules", []),
-            confidence=s.get("confidence", 0.0)
-        )
+        {
+            "skill_id": s.get("skill_id", ""),
+            "skill_name": s.get("skill_name", ""),
+            "skill_name_en": s.get("skill_name_en", ""),
+            "category": s.get("category", ""),
+            "matched_keywords": s.get("matched_keywords", []),
+            "matched_rules": s.get("matched_rules", []),
+            "confidence": s.get("confidence", 0.0)
+        }
         for s in data.get("matched_skills", [])
     ]
 
-    return AgentExecuteResponse(
-        status=data.get("status", result.status),
-        email_id=data.get("email_id", request.email_id),
-        reply_id=data.get("reply_id"),
-        ai_draft=data.get("ai_draft"),
-        matched_skills=matched_skills,
-        confidence=data.get("confidence", 0.0),
-        requires_escalation=data.get("requires_escalation", False),
-        escalation_reason=data.get("escalation_reason")
-    )
+    return _json_response({
+        "status": data.get("status", result.status),
+        "email_id": data.get("email_id", request.email_id),
+        "reply_id": data.get("reply_id"),
+        "ai_draft": data.get("ai_draft"),
+        "matched_skills": matched_skills,
+        "confidence": data.get("confidence", 0.0),
+        "requires_escalation": data.get("requires_escalation", False),
+        "escalation_reason": data.get("escalation_reason")
+    })
 
 
 @agents_router.post("/evolve", response_model=AgentEvolveResponse)
@@ -166,25 +180,25 @@ async def evolve_skill(request: AgentEvolveRequest):
 
     # Convert changes to response format
     changes = [
-        SkillChange(
-            change_type=c.get("change_type", ""),
-            skill_id=c.get("skill_id", ""),
-            skill_name=c.get("skill_name", ""),
-            detail=c.get("detail", "")
-        )
+        {
+            "change_type": c.get("change_type", ""),
+            "skill_id": c.get("skill_id", ""),
+            "skill_name": c.get("skill_name", ""),
+            "detail": c.get("detail", "")
+        }
         for c in data.get("changes", [])
     ]
 
-    return AgentEvolveResponse(
-        status=result.status,
-        reply_id=data.get("reply_id", request.reply_id),
-        changes=changes,
-        message=data.get("message", data.get("analysis_summary", ""))
-    )
+    return _json_response({
+        "status": result.status,
+        "reply_id": data.get("reply_id", request.reply_id),
+        "changes": changes,
+        "message": data.get("message", data.get("analysis_summary", ""))
+    })
 
 
 @agents_router.get("/status", response_model=AgentStatusResponse)
-async def get_agent_status():
+async def get_agent_status(request: Request):
     """
     Get the current status of all agents and system statistics.
 
@@ -193,6 +207,9 @@ async def get_agent_status():
     - Status of each agent (Learning, Execution, Evolution)
     - Skill library statistics
     - Email processing statistics
+
+    The response carries an ETag; pollers that send it back in If-None-Match
+    get an empty 304 Not Modified while nothing has changed.
     """
     # Get agent statuses
     agents_status = {
@@ -207,76 +224,92 @@ async def get_agent_status():
     )
     system_status = "healthy" if all_ready else "busy"
 
-    # Get skill library stats
-    async with async_session() as session:
-        # Total skills
-        total_skills = await session.execute(
-            select(func.count(Skill.id))
-        )
-        total_skills_count = total_skills.scalar() or 0
+    skill_library, email_stats = await _get_library_stats()
 
-        # Active skills
-        active_skills = await session.execute(
-            select(func.count(Skill.id)).where(Skill.is_active == True)
-        )
-        active_skills_count = active_skills.scalar() or 0
+    body = orjson.dumps({
+        "system_status": system_status,
+        "agents": agents_status,
+        "skill_library": skill_library,
+        "email_stats": email_stats
+    })
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
 
-        # Categories
-        categories = await session.execute(
-            select(func.count(func.distinct(Skill.category)))
-        )
-        categories_count = categories.scalar() or 0
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers={"ETag": etag})
 
-        # Email stats
-        total_emails = await session.execute(
-            select(func.count(Email.id))
-        )
-        total_emails_count = total_emails.scalar() or 0
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
-        customer_service_emails = await session.execute(
-            select(func.count(Email.id)).where(Email.is_customer_service == True)
-        )
-        cs_emails_count = customer_service_emails.scalar() or 0
 
-        processed_emails = await session.execute(
-            select(func.count(Email.id)).where(Email.processed == True)
-        )
-        processed_count = processed_emails.scalar() or 0
+async def _get_library_stats() -> tuple[dict, dict]:
+    """Skill library and email counts, reused for a few seconds across status polls"""
+    global _stats_cache
+
+    if _stats_cache:
+        version, computed_at, stats = _stats_cache
+        if version == SkillService.version and time.monotonic() - computed_at < _STATS_CACHE_TTL:
+            return stats
 
-    return AgentStatusResponse(
-        system_status=system_status,
-        agents=agents_status,
-        skill_library={
+    version = SkillService.version
+    async with async_session() as session:
+        # Skill stats: total, active, categories
+        skills_row = (await session.execute(
+            select(
+                func.count(Skill.id),
+                func.count(Skill.id).filter(Skill.is_active == True),
+                func.count(func.distinct(Skill.category))
+            )
+        )).one()
+        total_skills_count, active_skills_count, categories_count = skills_row
+
+        # Email stats: total, customer service, processed
+        emails_row = (await session.execute(
+            select(
+                func.count(Email.id),
+                func.count(Email.id).filter(Email.is_customer_service == True),
+                func.count(Email.id).filter(Email.processed == True)
+            )
+        )).one()
+        total_emails_count, cs_emails_count, processed_count = emails_row
+
+    stats = (
+        {
             "total_skills": total_skills_count,
             "active_skills": active_skills_count,
             "categories": categories_count
         },
-        email_stats={
+        {
             "total_emails": total_emails_count,
             "customer_service": cs_emails_count,
             "processed": processed_count
         }
     )
+    _stats_cache = (version, time.monotonic(), stats)
+    return stats
 
 
-@agents_router.get("/jobs/{job_id}")
+@agents_router.get(
+    "/jobs/{job_id}",
+    response_model=AgentJobStatusResponse,
+    response_model_exclude_unset=True
+)
 async def get_job_status(job_id: str):
     """
     Get the status of a background job (e.g., learning process).
     """
-    if job_id not in _background_jobs:
+    job = await job_service.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    job = _background_jobs[job_id]
-    return {
-        "job_id": job_id,
-        **job
-    }
+    return job
 
 
-@agents_router.post("/batch-execute")
+@agents_router.post("/batch-execute", response_model=AgentBatchExecuteResponse)
 async def batch_execute(
-    email_ids: list[str],
+    request: AgentBatchExecuteRequest,
     background_tasks: BackgroundTasks
 ):
     """
@@ -284,16 +317,8 @@ async def batch_execute(
 
     Returns a job_id to track progress.
     """
-    job_id = str(uuid.uuid4())
-
-    _background_jobs[job_id] = {
-        "status": "started",
-        "started_at": datetime.utcnow(),
-        "agent": "batch_execution",
-        "total": len(email_ids),
-        "completed": 0,
-        "results": []
-    }
+    email_ids = request.email_ids
+    job_id = await job_service.create_job("batch_execution", total=len(email_ids))
 
     background_tasks.add_task(
         _run_batch_execute_background,
@@ -309,28 +334,44 @@ async def batch_execute(
 
 
 async def _run_batch_execute_background(job_id: str, email_ids: list[str]):
-    """Background task for batch execution"""
-    results = []
-
-    for idx, email_id in enumerate(email_ids):
-        try:
-            result = await execution_agent.run({"email_id": email_id})
-            results.append({
-                "email_id": email_id,
-                "success": result.success,
-                "status": result.status,
-                "reply_id": result.data.get("reply_id")
-            })
-        except Exception as e:
-            results.append({
-                "email_id": email_id,
-                "success": False,
-                "error": str(e)
-            })
-
-        # Update progress
-        _background_jobs[job_id]["completed"] = idx + 1
-        _background_jobs[job_id]["results"] = results
-
-    _background_jobs[job_id]["status"] = "completed"
-    _background_jobs[job_id]["completed_at"] = datetime.utcnow()
+    """Background task for batch execution (emails are processed concurrently, bounded)"""
+    semaphore = asyncio.Semaphore(settings.BATCH_EXECUTE_CONCURRENCY)
+
+    async def execute_one(position: int, email_id: str) -> Optional[str]:
+        """Execute one email and record its result; returns an error if recording failed"""
+        async with semaphore:
+            try:
+                result = await execution_agent.run({"email_id": email_id})
+                item = {
+                    "email_id": email_id,
+                    "success": result.success,
+                    "status": result.status,
+                    "reply_id": result.data.get("reply_id")
+                }
+            except Exception as e:
+                item = {
+                    "email_id": email_id,
+                    "success": False,
+                    "error": str(e)
+                }
+
+            # Record progress (one row per email, in its own slot; progress is the row count)
+            try:
+                await job_service.add_result(job_id, position, item)
+            except Exception as e:
+                logger.error("Error recording batch result for %s: %s", email_id, e)
+                return f"{email_id}: {e}"
+            return None
+
+    # The job always gets a final status, even if recording results fails
+    status = "failed"
+    errors = []
+    try:
+        outcomes = await asyncio.gather(
+            *[execute_one(i, email_id) for i, email_id in enumerate(email_ids)],
+            return_exceptions=True
+        )
+        errors = [str(outcome) for outcome in outcomes if outcome is not None]
+        status = "partial" if errors else "completed"
+    finally:
+        await job_service.finish_job(job_id, status, errors=errors or None)
@@ -1,14 +1,19 @@
 """
 Emails router - API endpoints for email management
 """
+import logging
+import asyncio
+import hashlib
 import uuid
 import json
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
-from sqlalchemy import select, func
+from typing import Optional
+import orjson
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Response
+from sqlalchemy import bindparam, select, func, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.database import Email, async_session
+from models.database import Email, PriorityCache, async_session
 from models.schemas import (
     EmailListResponse,
     EmailResponse,
@@ -21,16 +26,47 @@ from services.zoho_service import ZohoMailService
 from services.zoho_oauth_service import zoho_oauth_service
 from services.email_classifier import EmailClassifierService
 from services.skill_service import SkillService
+from services.claude_json import parse_json_reply
+from agents.base_agent import BaseAgent
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
 emails_router = APIRouter()
 
+# Statements built once and reused (compiled form is cached by the engine)
+_EMAIL_BY_ID = select(Email).where(Email.id == bindparam("email_id"))
+_EMAIL_LIST_COLUMNS = (
+    Email.id, Email.zoho_id, Email.from_address, Email.from_name, Email.to_address,
+    Email.to_addresses, Email.cc_addresses, Email.subject, Email.body, Email.received_at,
+    Email.is_customer_service, Email.category, Email.processed,
+    Email.is_priority, Email.priority_score, Email.priority_reason
+)
+_UNCLASSIFIED_EMAILS = (
+    select(Email.id, Email.zoho_id, Email.from_address, Email.subject, Email.body)
+    .where(Email.category == None)
+    .limit(500)
+)
+
+# Retries when Claude rate-limits a priority analysis batch (HTTP 429)
+_PRIORITY_MAX_RETRIES = 2
+
 
-# Global services
+def _priority_cache_key(email) -> str:
+    """Hash the email content that priority analysis sees"""
+    content = "\0".join([
+        email.from_address or "",
+        email.subject or "",
+        (email.body or "")[:500]
+    ])
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Global services (classifier and skill services are stateless, built once at import)
 zoho_service = None
-classifier_service = None
-skill_service = None
+classifier_service = EmailClassifierService()
+skill_service = SkillService()
 
 
 def get_email_service():
@@ -38,10 +74,8 @@ def get_email_service():
     global zoho_service
 
     # Try OAuth first
-    if zoho_oauth_service.load_tokens():
-        success, _ = zoho_oauth_service.test_connection()
-        if success:
-            return zoho_oauth_service, "oauth"
+    if zoho_oauth_service.load_tokens() and zoho_oauth_service.is_connected():
+        return zoho_oauth_service, "oauth"
 
     # Fall back to IMAP
     if zoho_service is None:
@@ -49,16 +83,13 @@ def get_email_service():
     return zoho_service, "imap"
 
 
-def get_services():
-    """Get service instances"""
-    global zoho_service, classifier_service, skill_service
+def provide_services():
+    """Dependency: email service, classifier service, skill service and mode
 
+    Declared as a plain function so FastAPI runs it in its threadpool
+    (picking the email service may probe the Zoho API).
+    """
     email_service, mode = get_email_service()
-
-    if classifier_service is None:
-        classifier_service = EmailClassifierService()
-    if skill_service is None:
-        skill_service = SkillService()
     return email_service, classifier_service, skill_service, mode
 
 
@@ -67,11 +98,27 @@ async def get_emails(
     status: str = None,
     priority_only: bool = False,
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None
 ):
-    """Get all emails"""
+    """Get all emails
+
+    Pages can be fetched with offset, or with the keyset cursor returned as
+    next_cursor (pass it back as before / before_id), which seeks the
+    (received_at, id) index instead of skipping offset rows.
+
+    Rows are read as plain columns (no ORM objects) and serialized straight to
+    JSON; response_model only documents the shape.
+    """
     async with async_session() as session:
-        query = select(Email).order_by(Email.received_at.desc())
+        query = select(*_EMAIL_LIST_COLUMNS).order_by(Email.received_at.desc(), Email.id.desc())
+
+        # Keyset pagination: rows strictly after the cursor in (received_at, id) order
+        if before is not None and before_id is not None:
+            query = query.where(tuple_(Email.received_at, Email.id) < tuple_(before, before_id))
+        elif before is not None:
+            query = query.where(Email.received_at < before)
 
         if status == "pending":
             query = query.where(Email.processed == False)
@@ -82,62 +129,49 @@ async def get_emails(
         if priority_only:
             query = query.where(Email.is_priority == True)
 
-        # Get total count
-        count_query = select(func.count(Email.id))
-        total_result = await session.execute(count_query)
-        total = total_result.scalar() or 0
-
-        # Get pending count
-        pending_query = select(func.count(Email.id)).where(Email.processed == False)
-        pending_result = await session.execute(pending_query)
-        pending = pending_result.scalar() or 0
-        
-        # Get priority count
-        priority_query = select(func.count(Email.id)).where(Email.is_priority == True)
-        priority_result = await session.execute(priority_query)
-        priority_count = priority_result.scalar() or 0
+        # Get total, pending and priority counts in one query
+        counts_query = select(
+            func.count(Email.id),
+            func.count(Email.id).filter(Email.processed == False),
+            func.count(Email.id).filter(Email.is_priority == True)
+        )
+        total, pending, priority_count = (await session.execute(counts_query)).one()
 
         # Get emails with pagination
         query = query.offset(offset).limit(limit)
         result = await session.execute(query)
-        emails = result.scalars().all()
-
-        return {
-            "emails": [
-                {
-                    "id": str(e.id),
-                    "zoho_id": e.zoho_id,
-                    "from_address": e.from_address,
-                    "from_name": e.from_name,
-                    "to_address": e.to_address,
-                    "to_addresses": e.to_addresses or [],
-                    "cc_addresses": e.cc_addresses or [],
-                    "subject": e.subject,
-                    "body": e.body,
-                    "received_at": e.received_at.isoformat() if e.received_at else None,
-                    "is_customer_service": e.is_customer_service,
-                    "category": e.category,
-                    "processed": e.processed,
-                    "is_priority": e.is_priority,
-                    "priority_score": e.priority_score,
-                    "priority_reason": e.priority_reason
-                }
-                for e in emails
-            ],
+
+        emails = []
+        for row in result.mappings():
+            email = dict(row)
+            email["to_addresses"] = email["to_addresses"] or []
+            email["cc_addresses"] = email["cc_addresses"] or []
+            emails.append(email)
+
+    # Cursor for the next page (only when this page is full)
+    next_cursor = None
+    if emails and len(emails) == limit:
+        last = emails[-1]
+        next_cursor = {"before": last["received_at"], "before_id": last["id"]}
+
+    return Response(
+        content=orjson.dumps({
+            "emails": emails,
             "total": total,
             "pending": pending,
             "processed": total - pending,
-            "priority": priority_count
-        }
+            "priority": priority_count,
+            "next_cursor": next_cursor
+        }),
+        media_type="application/json"
+    )
 
 
 @emails_router.get("/{email_id}", response_model=EmailResponse)
 async def get_email(email_id: str):
     """Get a specific email"""
     async with async_session() as session:
-        from sqlalchemy import select
-
-        result = await session.execute(select(Email).where(Email.id == email_id))
+        result = await session.execute(_EMAIL_BY_ID, {"email_id": email_id})
         email = result.scalar_one_or_none()
 
         if not email:
@@ -170,8 +204,8 @@ async def config_zoho(config: ZohoConfigRequest):
         app_password=config.app_password
     )
 
-    # Test connection
-    success, message = zoho_service.test_connection()
+    # Test connection (blocking IMAP login, run in a worker thread)
+    success, message = await asyncio.to_thread(zoho_service.test_connection)
 
     if success:
         return ZohoConfigResponse(
@@ -192,7 +226,7 @@ async def clear_emails():
         deleted_count = result.rowcount
         await session.commit()
         
-        print(f"DEBUG: Cleared {deleted_count} emails from database")
+        logger.debug("Cleared %s emails from database", deleted_count)
         
     return {
         "status": "success",
@@ -204,8 +238,6 @@ async def clear_emails():
 @emails_router.post("/analyze-priority")
 async def analyze_email_priority(background_tasks: BackgroundTasks, limit: int = 100):
     """使用 AI 分析邮件价值，标记重点关注邮件"""
-    import httpx
-    
     if not settings.ANTHROPIC_API_KEY:
         raise HTTPException(status_code=400, detail="ANTHROPIC_API_KEY not configured")
     
@@ -220,53 +252,71 @@ async def analyze_email_priority(background_tasks: BackgroundTasks, limit: int =
 
 async def run_priority_analysis(limit: int = 100):
     """后台任务：分析邮件优先级"""
-    import httpx
-    
-    print("DEBUG: Starting priority analysis...")
+    logger.debug("Starting priority analysis...")
     
     async with async_session() as session:
-        # 获取未分析或需要重新分析的邮件
+        # 获取未分析或需要重新分析的邮件（只取分析需要的列）
         result = await session.execute(
-            select(Email)
+            select(Email.id, Email.from_address, Email.subject, Email.body)
             .where(Email.priority_score == 0)  # 未分析的邮件
             .order_by(Email.received_at.desc())
             .limit(limit)
         )
-        emails = result.scalars().all()
-        
-        if not emails:
-            print("DEBUG: No emails to analyze")
-            return
+        emails = result.all()
         
-        print(f"DEBUG: Analyzing {len(emails)} emails for priority...")
-        
-        base_url = settings.ANTHROPIC_BASE_URL.rstrip('/')
-        api_url = f"{base_url}/messages"
-        headers = {
-            "Content-Type": "application/json",
-            "x-api-key": settings.ANTHROPIC_API_KEY,
-            "anthropic-version": "2023-06-01"
-        }
-        
-        # 批量分析邮件（每批10封）
-        batch_size = 10
-        analyzed_count = 0
-        priority_count = 0
+    if not emails:
+        logger.debug("No emails to analyze")
+        return
+    
+    # 按内容哈希查缓存，相同内容的邮件（通知、订单确认等）只分析一次
+    keys_by_id = {email.id: _priority_cache_key(email) for email in emails}
+    async with async_session() as session:
+        cached = await session.execute(
+            select(PriorityCache.id, PriorityCache.result)
+            .where(PriorityCache.id.in_(set(keys_by_id.values())))
+        )
+        results_by_key = dict(cached.all())
+
+    # 每个未命中的内容哈希只取一封代表邮件发给 Claude
+    to_analyze = {}
+    for email in emails:
+        key = keys_by_id[email.id]
+        if key not in results_by_key:
+            to_analyze.setdefault(key, email)
+
+    logger.debug(
+        "Analyzing %s emails for priority (%s unique uncached)...",
+        len(emails), len(to_analyze)
+    )
+    
+    base_url = settings.ANTHROPIC_BASE_URL.rstrip('/')
+    api_url = f"{base_url}/messages"
+    headers = {
+        "Content-Type": "application/json",
+        "x-api-key": settings.ANTHROPIC_API_KEY,
+        "anthropic-version": "2023-06-01"
+    }
+    
+    # 批量分析邮件（每批10封）
+    batch_size = 10
+    analyzed_count = 0
+    priority_count = 0
+    
+    semaphore = asyncio.Semaphore(settings.ANTHROPIC_MAX_CONCURRENCY)
+
+    async def analyze_batch(batch: list) -> list:
+        """分析一批邮件，返回 Claude 给出的结果列表（失败返回空列表）"""
+        # 构建批量分析 prompt
+        emails_data = []
+        for email in batch:
+            emails_data.append({
+                "id": email.id,
+                "from": email.from_address,
+                "subject": email.subject,
+                "body": email.body[:500]  # 截断正文
+            })
         
-        for i in range(0, len(emails), batch_size):
-            batch = emails[i:i + batch_size]
-            
-            # 构建批量分析 prompt
-            emails_data = []
-            for email in batch:
-                emails_data.append({
-                    "id": email.id,
-                    "from": email.from_address,
-                    "subject": email.subject,
-                    "body": email.body[:500]  # 截断正文
-                })
-            
-            prompt = f"""分析以下 {len(emails_data)} 封邮件，判断哪些是需要重点关注的高价值邮件。
+        prompt = f"""分析以下 {len(emails_data)} 封邮件，判断哪些是需要重点关注的高价值邮件。
 
 【重点关注（高优先级）】
 - 正常的工作沟通邮件、业务往来邮件
@@ -299,66 +349,119 @@ async def run_priority_analysis(limit: int = 100):
 
 只返回 JSON，不要其他内容。"""
 
-            try:
-                data = {
-                    "model": "claude-3-5-haiku-20241022",
-                    "max_tokens": 2000,
-                    "messages": [{"role": "user", "content": prompt}]
-                }
-                
-                async with httpx.AsyncClient(timeout=60) as client:
-                    response = await client.post(api_url, headers=headers, json=data)
-                
-                if response.status_code != 200:
-                    print(f"DEBUG: Claude API error: {response.status_code}")
-                    continue
-                
-                result_json = response.json()
-                result_text = result_json["content"][0]["text"]
-                
-                # 提取 JSON
-                if "```json" in result_text:
-                    result_text = result_text.split("```json")[1].split("```")[0].strip()
-                elif "```" in result_text:
-                    result_text = result_text.split("```")[1].split("```")[0].strip()
-                
-                analysis = json.loads(result_text)
-                
-                # 更新邮件优先级
-                for item in analysis.get("results", []):
-                    email_id = item.get("id")
-                    is_priority = item.get("is_priority", False)
-                    score = item.get("score", 0)
-                    reason = item.get("reason", "")
-                    
-                    # 找到对应邮件并更新
-                    for email in batch:
-                        if email.id == email_id:
-                            email.is_priority = is_priority
-                            email.priority_score = score
-                            email.priority_reason = reason
-                            analyzed_count += 1
-                            if is_priority:
-                                priority_count += 1
-                            break
-                
-                await session.commit()
-                print(f"DEBUG: Batch analyzed, {priority_count} priority emails found so far")
-                
-            except Exception as e:
-                print(f"DEBUG: Error analyzing batch: {e}")
-                continue
+        data = {
+            "model": "claude-3-5-haiku-20241022",
+            "max_tokens": 2000,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+
+        async with semaphore:
+            # 被限流 (429) 时按 Retry-After 等待后重试
+            for attempt in range(_PRIORITY_MAX_RETRIES + 1):
+                response = await BaseAgent.get_client().post(
+                    api_url, headers=headers, json=data, timeout=60
+                )
+                if response.status_code != 429 or attempt == _PRIORITY_MAX_RETRIES:
+                    break
+                retry_after = response.headers.get("retry-after", "")
+                await asyncio.sleep(float(retry_after) if retry_after.isdigit() else 2 ** attempt)
+
+        if response.status_code != 200:
+            logger.warning("Claude API error: %s", response.status_code)
+            return []
+        
+        result_json = response.json()
+        result_text = result_json["content"][0]["text"]
         
-        print(f"DEBUG: Priority analysis complete. Analyzed: {analyzed_count}, Priority: {priority_count}")
+        analysis = parse_json_reply(result_text)
+        items = analysis.get("results") if isinstance(analysis, dict) else None
+        if not isinstance(items, list):
+            logger.warning("Unexpected priority analysis response: %s", result_text[:200])
+            return []
+        # 丢弃格式不对的条目（非对象或 ID 不是字符串）
+        return [
+            item for item in items
+            if isinstance(item, dict) and isinstance(item.get("id"), str)
+        ]
+
+    # 所有批次并发请求 Claude（受 semaphore 限制）
+    pending = list(to_analyze.values())
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    batch_results = await asyncio.gather(
+        *[analyze_batch(batch) for batch in batches],
+        return_exceptions=True
+    )
+
+    # 收集 Claude 的新结果（只接受本次分析的邮件 ID）
+    email_ids = {email.id for email in pending}
+    new_results = {}
+    for items in batch_results:
+        if isinstance(items, Exception):
+            logger.warning("Error analyzing batch: %s", items)
+            continue
+
+        for item in items:
+            if item.get("id") not in email_ids:
+                continue
+
+            new_results[keys_by_id[item["id"]]] = {
+                "is_priority": item.get("is_priority", False),
+                "score": item.get("score", 0),
+                "reason": item.get("reason", "")
+            }
+    results_by_key.update(new_results)
+
+    # 更新邮件优先级（缓存命中和新结果一起）
+    updates = []
+    for email in emails:
+        analysis = results_by_key.get(keys_by_id[email.id])
+        if analysis is None:
+            continue
+
+        updates.append({
+            "id": email.id,
+            "is_priority": analysis["is_priority"],
+            "priority_score": analysis["score"],
+            "priority_reason": analysis["reason"]
+        })
+        analyzed_count += 1
+        if analysis["is_priority"]:
+            priority_count += 1
+
+    # 一条 executemany UPDATE（按主键）保存所有结果
+    if updates:
+        async with async_session() as session:
+            await session.execute(update(Email), updates)
+            await session.commit()
+
+    # 保存新结果到缓存（缓存写入失败不影响分析结果）
+    if new_results:
+        try:
+            async with async_session() as session:
+                session.add_all(
+                    PriorityCache(id=key, result=analysis)
+                    for key, analysis in new_results.items()
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning("Error writing priority cache: %s", e)
+    
+    logger.debug("Priority analysis complete. Analyzed: %s, Priority: %s", analyzed_count, priority_count)
 
 
 @emails_router.post("/sync", response_model=SyncEmailsResponse)
-async def sync_emails(request: SyncEmailsRequest, background_tasks: BackgroundTasks):
+async def sync_emails(
+    request: SyncEmailsRequest,
+    background_tasks: BackgroundTasks,
+    services: tuple = Depends(provide_services)
+):
     """Sync emails from Zoho Mail"""
-    zoho_service, classifier_service, skill_service, mode = get_services()
+    zoho_service, classifier_service, skill_service, mode = services
 
     # Fetch emails from Zoho with optional date filtering
-    fetched_emails = zoho_service.fetch_emails(
+    # (blocking HTTP/IMAP I/O runs in a worker thread so the event loop stays free)
+    fetched_emails = await asyncio.to_thread(
+        zoho_service.fetch_emails,
         count=request.count,
         sync_range=request.sync_range,
         from_date=request.from_date,
@@ -375,38 +478,38 @@ async def sync_emails(request: SyncEmailsRequest, background_tasks: BackgroundTa
     # Save to database
     new_count = 0
     async with async_session() as session:
-        for email_data in fetched_emails:
-            # Check if already exists
-            from sqlalchemy import select
+        # Check which emails already exist (one IN query instead of one per email)
+        existing = await session.execute(
+            select(Email.zoho_id).where(
+                Email.zoho_id.in_([email_data["zoho_id"] for email_data in fetched_emails])
+            )
+        )
+        seen_zoho_ids = set(existing.scalars())
 
-            existing = await session.execute(
-                select(Email).where(Email.zoho_id == email_data["zoho_id"])
+        for email_data in fetched_emails:
+            if email_data["zoho_id"] in seen_zoho_ids:
+                continue
+            seen_zoho_ids.add(email_data["zoho_id"])
+
+            email = Email(
+                id=str(uuid.uuid4()),
+                zoho_id=email_data["zoho_id"],
+                from_address=email_data["from_address"],
+                from_name=email_data.get("from_name"),
+                to_address=email_data["to_address"],
+                to_addresses=email_data.get("to_addresses", []),
+                cc_addresses=email_data.get("cc_addresses", []),
+                subject=email_data["subject"],
+                body=email_data["body"],
+                received_at=email_data["received_at"],
+                is_customer_service=request.mark_as_customer_service
             )
-            existing_email = existing.scalar_one_or_none()
-
-            if not existing_email:
-                email = Email(
-                    id=str(uuid.uuid4()),
-                    zoho_id=email_data["zoho_id"],
-                    from_address=email_data["from_address"],
-                    from_name=email_data.get("from_name"),
-                    to_address=email_data["to_address"],
-                    to_addresses=email_data.get("to_addresses", []),
-                    cc_addresses=email_data.get("cc_addresses", []),
-                    subject=email_data["subject"],
-                    body=email_data["body"],
-                    received_at=email_data["received_at"],
-                    is_customer_service=request.mark_as_customer_service
-                )
-                session.add(email)
-                new_count += 1
+            session.add(email)
+            new_count += 1
 
         await session.commit()
 
-    # Get total count
-    async with async_session() as session:
-        from sqlalchemy import func
-
+        # Get total count
         result = await session.execute(select(func.count(Email.id)))
         total = result.scalar() or 0
 
@@ -423,47 +526,53 @@ async def sync_emails(request: SyncEmailsRequest, background_tasks: BackgroundTa
 
 async def classify_new_emails():
     """Classify unclassified emails in background"""
-    global classifier_service
-
-    if not classifier_service:
-        classifier_service = EmailClassifierService()
-
-    print("DEBUG: Starting email classification...")
+    logger.debug("Starting email classification...")
     
     async with async_session() as session:
-        from sqlalchemy import select
-
         # Get unclassified emails - increase limit to 500
-        result = await session.execute(
-            select(Email).where(Email.category == None).limit(500)
-        )
-        emails = result.scalars().all()
+        result = await session.execute(_UNCLASSIFIED_EMAILS)
+        emails = result.all()
         
-        print(f"DEBUG: Found {len(emails)} unclassified emails")
+    logger.debug("Found %s unclassified emails", len(emails))
 
-        classified_count = 0
-        customer_service_count = 0
-        
-        for email in emails:
-            email_data = {
+    classified_count = 0
+    customer_service_count = 0
+    updates = []
+
+    # Classify concurrently; limit in-flight Claude calls
+    semaphore = asyncio.Semaphore(settings.ANTHROPIC_MAX_CONCURRENCY)
+
+    async def classify_one(email) -> dict:
+        async with semaphore:
+            return await classifier_service.classify_email({
                 "zoho_id": email.zoho_id,
                 "from_address": email.from_address,
                 "subject": email.subject,
                 "body": email.body
-            }
-
-            classification = await classifier_service.classify_email(email_data)
+            })
 
-            email.is_customer_service = classification.get("is_customer_service", False)
-            email.category = classification.get("category")
-            
-            classified_count += 1
-            if email.is_customer_service:
-                customer_service_count += 1
-                print(f"DEBUG: Classified as customer service: {email.subject[:50]}... -> {email.category}")
-
-        await session.commit()
-        print(f"DEBUG: Classification complete. {classified_count} emails classified, {customer_service_count} are customer service.")
+    classifications = await asyncio.gather(*[classify_one(email) for email in emails])
+    
+    for email, classification in zip(emails, classifications):
+        is_customer_service = classification.get("is_customer_service", False)
+        category = classification.get("category")
+        updates.append({
+            "id": email.id,
+            "is_customer_service": is_customer_service,
+            "category": category
+        })
+        
+        classified_count += 1
+        if is_customer_service:
+            customer_service_count += 1
+            logger.debug("Classified as customer service: %s... -> %s", email.subject[:50], category)
+
+    # Save all classifications with one executemany UPDATE (by primary key)
+    if updates:
+        async with async_session() as session:
+            await session.execute(update(Email), updates)
+            await session.commit()
+    logger.debug("Classification complete. %s emails classified, %s are customer service.", classified_count, customer_service_count)
 
 
 @emails_router.post("/classify")
@@ -1,6 +1,9 @@
 """
 OAuth router - Zoho Mail OAuth 2.0 endpoints
 """
+import logging
+import asyncio
+import os
 from fastapi import APIRouter, HTTPException, Request, Query
 from pydantic import BaseModel
 from typing import Optional
@@ -9,6 +12,8 @@ from services.zoho_oauth_service import zoho_oauth_service
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
 oauth_router = APIRouter()
 
 
@@ -43,15 +48,12 @@ def get_auth_url():
             auth_url=None
         )
 
-    # Try to load existing tokens
-    if zoho_oauth_service.load_tokens():
-        # Test if tokens still work
-        success, _ = zoho_oauth_service.test_connection()
-        if success:
-            return OAuthConfigResponse(
-                configured=True,
-                auth_url=None
-            )
+    # Try to load existing tokens and check they still work
+    if zoho_oauth_service.load_tokens() and zoho_oauth_service.is_connected():
+        return OAuthConfigResponse(
+            configured=True,
+            auth_url=None
+        )
 
     # Generate new auth URL
     auth_url = zoho_oauth_service.get_auth_url()
@@ -81,27 +83,28 @@ def configure_oauth(config: OAuthConfigRequest):
 
 
 @oauth_router.post("/callback")
-def oauth_callback(code: str = Query(...), state: Optional[str] = Query(None)):
+async def oauth_callback(code: str = Query(...), state: Optional[str] = Query(None)):
     """Handle OAuth callback and exchange code for tokens"""
     try:
-        print(f"DEBUG: Received OAuth callback with code: {code[:20]}...")
+        logger.debug("Received OAuth callback with code: %s...", code[:20])
 
         # Make sure we have the credentials loaded
         if not zoho_oauth_service.client_id or not zoho_oauth_service.client_secret:
             raise Exception("Client credentials not configured. Please configure OAuth first.")
 
-        print(f"DEBUG: Client ID: {zoho_oauth_service.client_id[:20]}...")
+        logger.debug("Client ID: %s...", zoho_oauth_service.client_id[:20])
 
         # Exchange code for tokens
-        result = zoho_oauth_service.exchange_code_for_token(code)
-        print(f"DEBUG: Token exchange successful")
+        # (blocking HTTP / file I/O runs in a worker thread, off the event loop)
+        result = await asyncio.to_thread(zoho_oauth_service.exchange_code_for_token, code)
+        logger.debug("Token exchange successful")
 
         # Test connection to get user_email
-        success, message = zoho_oauth_service.test_connection()
-        print(f"DEBUG: Connection test - success: {success}, message: {message}")
+        success, message = await asyncio.to_thread(zoho_oauth_service.test_connection)
+        logger.debug("Connection test - success: %s, message: %s", success, message)
 
         # Save tokens (after test_connection so user_email is included)
-        zoho_oauth_service.save_tokens()
+        await asyncio.to_thread(zoho_oauth_service.save_tokens)
 
         if not success:
             raise Exception(message)
@@ -113,24 +116,22 @@ def oauth_callback(code: str = Query(...), state: Optional[str] = Query(None)):
         }
 
     except Exception as e:
-        print(f"ERROR: OAuth callback failed: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("OAuth callback failed: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @oauth_router.get("/status", response_model=OAuthStatusResponse)
-def get_oauth_status():
+async def get_oauth_status():
     """Get current OAuth connection status"""
     # Try to load tokens
-    if not zoho_oauth_service.load_tokens():
+    if not await asyncio.to_thread(zoho_oauth_service.load_tokens):
         return OAuthStatusResponse(
             connected=False,
             user_email=None
         )
 
     # Test connection
-    success, message = zoho_oauth_service.test_connection()
+    success, message = await asyncio.to_thread(zoho_oauth_service.test_connection)
 
     return OAuthStatusResponse(
         connected=success,
@@ -139,17 +140,16 @@ def get_oauth_status():
 
 
 @oauth_router.post("/disconnect")
-def disconnect_oauth():
+async def disconnect_oauth():
     """Disconnect and revoke OAuth tokens"""
     try:
         # Revoke tokens
-        zoho_oauth_service.revoke_token()
+        await asyncio.to_thread(zoho_oauth_service.revoke_token)
 
         # Delete token file
-        import os
         token_file = "data/zoho_tokens.json"
         if os.path.exists(token_file):
-            os.remove(token_file)
+            await asyncio.to_thread(os.remove, token_file)
 
         return {"success": True, "message": "Disconnected successfully"}
 
@@ -158,11 +158,11 @@ def disconnect_oauth():
 
 
 @oauth_router.post("/refresh")
-def refresh_oauth_token():
+async def refresh_oauth_token():
     """Manually refresh the OAuth token"""
     try:
-        result = zoho_oauth_service.refresh_access_token()
-        zoho_oauth_service.save_tokens()
+        result = await asyncio.to_thread(zoho_oauth_service.refresh_access_token)
+        await asyncio.to_thread(zoho_oauth_service.save_tokens)
 
         return {
             "success": True,
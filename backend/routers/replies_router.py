@@ -1,10 +1,12 @@
 """
 Replies router - API endpoints for reply generation and sending
 """
+import logging
+import asyncio
 import uuid
 from datetime import datetime
 from fastapi import APIRouter, HTTPException
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 
 from models.database import Email, Reply, async_session
 from models.schemas import (
@@ -14,13 +16,22 @@ from models.schemas import (
     SendReplyResponse
 )
 from services.skill_service import SkillService
+from services.reply_templates import render_template_vars
 from services.zoho_service import ZohoMailService
 from services.zoho_oauth_service import zoho_oauth_service
+from agents.base_agent import BaseAgent
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
 replies_router = APIRouter()
 
+# Lookups by primary key, built once and reused (compiled form is cached by the engine)
+_EMAIL_BY_ID = select(Email).where(Email.id == bindparam("email_id"))
+_REPLY_BY_ID = select(Reply).where(Reply.id == bindparam("reply_id"))
+
+
 skill_service = SkillService()
 zoho_service = ZohoMailService()
 
@@ -28,10 +39,8 @@ zoho_service = ZohoMailService()
 def get_email_sender():
     """Get appropriate email sender (OAuth or SMTP)"""
     # Try OAuth first
-    if zoho_oauth_service.load_tokens():
-        success, _ = zoho_oauth_service.test_connection()
-        if success:
-            return zoho_oauth_service
+    if zoho_oauth_service.load_tokens() and zoho_oauth_service.is_connected():
+        return zoho_oauth_service
     # Fall back to SMTP
     return zoho_service
 
@@ -41,9 +50,7 @@ async def generate_reply(request: GenerateReplyRequest):
     """Generate a reply for an email using AI"""
     async with async_session() as session:
         # Get email
-        result = await session.execute(
-            select(Email).where(Email.id == request.email_id)
-        )
+        result = await session.execute(_EMAIL_BY_ID, {"email_id": request.email_id})
         email = result.scalar_one_or_none()
 
         if not email:
@@ -90,13 +97,7 @@ Best regards
         if rules and rules[0].get("response_template"):
             # Use template from best matching rule
             template = rules[0]["response_template"]
-            ai_draft = template.replace("{{customer_name}}", email.from_name or "Customer")
-            ai_draft = ai_draft.replace("{{customer_name}}", email.from_name or "Customer")
-            ai_draft = ai_draft.replace("{customer_name}", email.from_name or "Customer")
-            ai_draft = ai_draft.replace("{{{customer_name}}}", email.from_name or "Customer")
-            ai_draft = ai_draft.replace("{{company_name}}", "We")
-            ai_draft = ai_draft.replace("{company_name}", "We")
-            ai_draft = ai_draft.replace("{{{company_name}}}", "We")
+            ai_draft = render_template_vars(template, email.from_name or "Customer")
         else:
             # Generate with Claude if available
             if settings.ANTHROPIC_API_KEY:
@@ -138,8 +139,6 @@ Best regards"""
 
 async def generate_with_claude(email: Email, skill: dict) -> str:
     """Generate reply using Claude"""
-    import httpx
-
     base_url = settings.ANTHROPIC_BASE_URL.rstrip('/')
     api_url = f"{base_url}/messages"
     headers = {
@@ -175,17 +174,18 @@ Generate a helpful, professional reply. Keep it concise and friendly. Only retur
             "messages": [{"role": "user", "content": prompt}]
         }
         
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(api_url, headers=headers, json=data)
+        response = await BaseAgent.get_client().post(
+            api_url, headers=headers, json=data, timeout=30
+        )
         
         if response.status_code == 200:
             result_json = response.json()
             return result_json["content"][0]["text"]
         else:
-            print(f"Error calling Claude API: {response.status_code}")
+            logger.error("Error calling Claude API: %s", response.status_code)
             return f"Dear {email.from_name or 'Customer'},\n\nThank you for your inquiry. We are looking into it and will get back to you shortly.\n\nBest regards"
     except Exception as e:
-        print(f"Error generating reply: {e}")
+        logger.error("Error generating reply: %s", e)
         return f"Dear {email.from_name or 'Customer'},\n\nThank you for your inquiry. We are looking into it and will get back to you shortly.\n\nBest regards"
 
 
@@ -193,21 +193,15 @@ Generate a helpful, professional reply. Keep it concise and friendly. Only retur
 async def send_reply(request: SendReplyRequest):
     """Send a reply via Zoho Mail"""
     async with async_session() as session:
-        from sqlalchemy import select
-
         # Get reply
-        result = await session.execute(
-            select(Reply).where(Reply.id == request.reply_id)
-        )
+        result = await session.execute(_REPLY_BY_ID, {"reply_id": request.reply_id})
         reply = result.scalar_one_or_none()
 
         if not reply:
             raise HTTPException(status_code=404, detail="Reply not found")
 
         # Get email
-        result = await session.execute(
-            select(Email).where(Email.id == reply.email_id)
-        )
+        result = await session.execute(_EMAIL_BY_ID, {"email_id": reply.email_id})
         email = result.scalar_one_or_none()
 
         if not email:
@@ -216,11 +210,13 @@ async def send_reply(request: SendReplyRequest):
         # Determine content to send
         content = request.content or reply.human_edited or reply.ai_draft
 
-        # Get email sender (OAuth or SMTP)
-        sender = get_email_sender()
+        # Get email sender (OAuth or SMTP); its connection check and the send
+        # are blocking HTTP/SMTP calls, so they run in a worker thread
+        sender = await asyncio.to_thread(get_email_sender)
 
         # Send via Zoho
-        success = sender.send_email(
+        success = await asyncio.to_thread(
+            sender.send_email,
             to_address=email.from_address,
             subject=f"Re: {email.subject}",
             body=content,
@@ -250,11 +246,7 @@ async def send_reply(request: SendReplyRequest):
 async def submit_feedback(reply_id: str, feedback: dict):
     """Submit feedback on a reply (for evolution learning)"""
     async with async_session() as session:
-        from sqlalchemy import select
-
-        result = await session.execute(
-            select(Reply).where(Reply.id == reply_id)
-        )
+        result = await session.execute(_REPLY_BY_ID, {"reply_id": reply_id})
         reply = result.scalar_one_or_none()
 
         if not reply:
@@ -1,11 +1,11 @@
 """
 Skills router - API endpoints for skill management
 """
-import httpx
+import logging
 from fastapi import APIRouter, HTTPException, BackgroundTasks
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 
-from models.database import async_session
+from models.database import Skill, async_session
 from models.schemas import (
     SkillListResponse,
     SkillResponse,
@@ -14,11 +14,18 @@ from models.schemas import (
 )
 from services.skill_service import SkillService
 from services.email_classifier import EmailClassifierService
+from services.claude_json import parse_json_reply
+from agents.base_agent import BaseAgent
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
 skills_router = APIRouter()
 
+# Skill lookup by primary key, built once and reused (compiled form is cached by the engine)
+_SKILL_BY_ID = select(Skill).where(Skill.id == bindparam("skill_id"))
+
 skill_service = SkillService()
 
 
@@ -49,13 +56,11 @@ async def get_skill(skill_id: str):
 @skills_router.get("/{skill_id}/source-emails")
 async def get_skill_source_emails(skill_id: str, limit: int = 20):
     """获取 Skill 的源邮件列表 - 用于追溯 Skill 是基于哪些邮件生成的"""
-    from models.database import SkillSourceEmail, Email, Skill
+    from models.database import SkillSourceEmail, Email
     
     async with async_session() as session:
         # 验证 Skill 存在
-        skill_result = await session.execute(
-            select(Skill).where(Skill.id == skill_id)
-        )
+        skill_result = await session.execute(_SKILL_BY_ID, {"skill_id": skill_id})
         skill = skill_result.scalar_one_or_none()
         if not skill:
             raise HTTPException(status_code=404, detail="Skill not found")
@@ -120,8 +125,6 @@ async def run_learning(email_count: int = 100, force: bool = False):
 
     # Get customer service emails
     async with async_session() as session:
-        from sqlalchemy import select
-
         result = await session.execute(
             select(Email)
             .where(Email.is_customer_service == True)
@@ -143,7 +146,7 @@ async def run_learning(email_count: int = 100, force: bool = False):
 
     # Use Claude to extract skills from each category
     if not settings.ANTHROPIC_API_KEY:
-        print("DEBUG: No ANTHROPIC_API_KEY configured, skipping learning")
+        logger.debug("No ANTHROPIC_API_KEY configured, skipping learning")
         return
 
     base_url = settings.ANTHROPIC_BASE_URL.rstrip('/')
@@ -207,23 +210,18 @@ Only return the JSON, nothing else."""
                 "messages": [{"role": "user", "content": prompt}]
             }
             
-            async with httpx.AsyncClient(timeout=60) as client:
-                response = await client.post(api_url, headers=headers, json=data)
+            response = await BaseAgent.get_client().post(
+                api_url, headers=headers, json=data, timeout=60
+            )
             
             if response.status_code != 200:
-                print(f"Error calling Claude API for {category}: {response.status_code} - {response.text}")
+                logger.error("Error calling Claude API for %s: %s - %s", category, response.status_code, response.text)
                 continue
                 
             result_json = response.json()
             result_text = result_json["content"][0]["text"]
 
-            # Extract JSON
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-
-            skill_data = json.loads(result_text)
+            skill_data = parse_json_reply(result_text)
 
             # Create or update skill
             existing = await skill_service.get_all_skills()
@@ -259,10 +257,10 @@ Only return the JSON, nothing else."""
                             )
                             session.add(source_record)
                     await session.commit()
-                    print(f"DEBUG: Recorded {len(source_email_ids)} source emails for skill: {skill_data.get('name')}")
+                    logger.debug("Recorded %s source emails for skill: %s", len(source_email_ids), skill_data.get('name'))
 
         except Exception as e:
-            print(f"Error extracting skill for {category}: {e}")
+            logger.error("Error extracting skill for %s: %s", category, e)
             continue
 
     # Save to file
@@ -0,0 +1,32 @@
+"""
+Claude JSON - Parse JSON out of Claude's text replies
+"""
+import re
+from typing import Any
+
+import orjson
+
+
+# Matches the contents of the first markdown code block (```json or generic ```)
+_CODE_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+def parse_json_reply(text: str) -> Any:
+    """Parse a JSON reply from Claude, unwrapping a markdown code block if present
+
+    Falls back to the outermost {...} span when the JSON is surrounded by prose.
+
+    Raises:
+        orjson.JSONDecodeError: If no JSON can be parsed
+    """
+    match = _CODE_FENCE_RE.search(text)
+    if match:
+        text = match.group(1)
+
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end < start:
+            raise
+        return orjson.loads(text[start:end + 1])
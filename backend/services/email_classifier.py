@@ -1,12 +1,18 @@
 """
 Email Classifier Service - Classify emails using Claude
 """
+import logging
 import os
-import json
+import hashlib
 import httpx
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from config import settings
+from models.database import ClassificationCache, async_session
+from services.claude_json import parse_json_reply
+
+
+logger = logging.getLogger(__name__)
 
 
 class EmailClassifierService:
@@ -35,6 +41,11 @@ class EmailClassifierService:
                 "reasoning": "No Claude API key configured"
             }
 
+        cache_key = self._cache_key(email_data)
+        cached = await self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+
         prompt = f"""You are an email classifier. Analyze the following email and determine:
 
 1. Is this a customer service related email? (inquiry, complaint, support request, etc.)
@@ -72,7 +83,7 @@ Only return the JSON, nothing else."""
                 response = await client.post(self.api_url, headers=headers, json=data)
                 
             if response.status_code != 200:
-                print(f"Error calling Claude API: {response.status_code} - {response.text}")
+                logger.error("Error calling Claude API: %s - %s", response.status_code, response.text)
                 return {
                     "is_customer_service": False,
                     "category": None,
@@ -83,23 +94,19 @@ Only return the JSON, nothing else."""
             result_json = response.json()
             result_text = result_json["content"][0]["text"]
 
-            # Extract JSON
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-
-            result = json.loads(result_text)
+            result = parse_json_reply(result_text)
 
             # Map non-customer-service to None
             if result.get("category") == "non-customer-service":
                 result["is_customer_service"] = False
                 result["category"] = None
 
+            await self._store_cached(cache_key, result)
+
             return result
 
         except Exception as e:
-            print(f"Error classifying email: {e}")
+            logger.error("Error classifying email: %s", e)
             return {
                 "is_customer_service": False,
                 "category": None,
@@ -107,6 +114,34 @@ Only return the JSON, nothing else."""
                 "reasoning": f"Error: {str(e)}"
             }
 
+    def _cache_key(self, email_data: Dict) -> str:
+        """Hash the email content that classification depends on"""
+        content = "\0".join([
+            email_data.get("from_address", "") or "",
+            email_data.get("subject", "") or "",
+            email_data.get("body", "") or ""
+        ])
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+    async def _get_cached(self, cache_key: str) -> Optional[Dict]:
+        """Get a cached classification result, if any"""
+        try:
+            async with async_session() as session:
+                cached = await session.get(ClassificationCache, cache_key)
+                return dict(cached.result) if cached else None
+        except Exception as e:
+            logger.warning("Error reading classification cache: %s", e)
+            return None
+
+    async def _store_cached(self, cache_key: str, result: Dict) -> None:
+        """Store a classification result (cache failures never fail classification)"""
+        try:
+            async with async_session() as session:
+                await session.merge(ClassificationCache(id=cache_key, result=result))
+                await session.commit()
+        except Exception as e:
+            logger.warning("Error writing classification cache: %s", e)
+
     async def batch_classify(self, emails: List[Dict]) -> List[Dict]:
         """Classify multiple emails
 
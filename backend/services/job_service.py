@@ -0,0 +1,111 @@
+"""
+Job Service - Track background agent jobs in the database
+"""
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+
+from models.database import AgentJob, AgentJobResult, async_session
+
+
+class JobService:
+    """Service for background job status, shared by all worker processes"""
+
+    async def create_job(self, agent: str, total: Optional[int] = None) -> str:
+        """Create a job in "started" state
+
+        Args:
+            agent: Job type ("learning", "batch_execution")
+            total: Number of items for batch jobs
+
+        Returns:
+            Job ID
+        """
+        job_id = uuid.uuid4().hex
+        async with async_session() as session:
+            session.add(AgentJob(id=job_id, agent=agent, status="started", total=total))
+            await session.commit()
+        return job_id
+
+    async def finish_job(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        errors: Optional[List[str]] = None
+    ):
+        """Mark a job as finished
+
+        Args:
+            job_id: Job ID
+            status: Final status
+            result: Result data (learning jobs)
+            errors: Error messages
+        """
+        values = {"status": status, "completed_at": datetime.utcnow()}
+        if result is not None:
+            values["result"] = result
+        if errors is not None:
+            values["errors"] = errors
+
+        async with async_session() as session:
+            await session.execute(
+                update(AgentJob).where(AgentJob.id == job_id).values(**values)
+            )
+            await session.commit()
+
+    async def add_result(self, job_id: str, position: int, result: Dict[str, Any]):
+        """Record one item's result for a batch job (append-only, safe under concurrency)
+
+        Args:
+            job_id: Job ID
+            position: Index of the item in the batch
+            result: Result of a single item
+        """
+        async with async_session() as session:
+            await session.execute(
+                insert(AgentJobResult).values(job_id=job_id, position=position, result=result)
+            )
+            await session.commit()
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's status
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            Job status with only the fields the job has set, or None
+        """
+        async with async_session() as session:
+            job = await session.get(AgentJob, job_id)
+            if not job:
+                return None
+
+            data = {
+                "job_id": job.id,
+                "status": job.status,
+                "agent": job.agent,
+                "started_at": job.started_at,
+            }
+            for key in ("completed_at", "total", "result", "errors"):
+                value = getattr(job, key)
+                if value is not None:
+                    data[key] = value
+
+            if job.total is not None:
+                result = await session.execute(
+                    select(AgentJobResult.result)
+                    .where(AgentJobResult.job_id == job_id)
+                    .order_by(AgentJobResult.position)
+                )
+                data["results"] = list(result.scalars())
+                data["completed"] = len(data["results"])
+
+            return data
+
+
+# Global instance
+job_service = JobService()
@@ -0,0 +1,23 @@
+"""
+Reply Templates - Fill placeholders in skill response templates
+"""
+import re
+from typing import Dict
+
+
+# Matches {name} / {{name}} / {{{name}}} style placeholders in reply templates
+_TEMPLATE_VAR_RE = re.compile(r"\{{1,3}(\w+)\}{1,3}")
+
+
+def render_template_vars(template: str, customer_name: str = "Customer") -> str:
+    """Fill a response template's placeholders in one pass
+
+    Args:
+        template: Response template from a skill rule
+        customer_name: Name used for {customer_name}
+
+    Returns:
+        Filled template (unknown placeholders are left as-is)
+    """
+    values: Dict[str, str] = {"customer_name": customer_name, "company_name": "We"}
+    return _TEMPLATE_VAR_RE.sub(lambda m: values.get(m.group(1), m.group(0)), template)
@@ -1,18 +1,74 @@
 """
 Skill Service - Manage skills and skill matching
 """
+import hashlib
 import json
+import time
+import unicodedata
 import uuid
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from typing import List, Dict, NamedTuple, Optional, Tuple
 from pathlib import Path
 
+import ahocorasick
+from pydantic import TypeAdapter
+
 from models.database import Skill, async_session
 from models.schemas import SkillCreate, SkillResponse
 
+# Validates a whole list of Skill rows in one pydantic-core call
+_SKILL_LIST_ADAPTER = TypeAdapter(List[SkillResponse])
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for keyword matching
+
+    NFKC folds full-width/compatibility forms, accents (e.g. "RÉFUND") are
+    stripped, case is folded and whitespace runs are collapsed. Only the
+    combining diacritical marks block is stripped, so CJK text (e.g. kana
+    voicing marks) is left intact.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not "\u0300" <= c <= "\u036f")
+    return " ".join(unicodedata.normalize("NFKC", stripped).casefold().split())
+
+
+class SkillTerms(NamedTuple):
+    """A skill's matching terms, normalized once per keyword-index build"""
+    # (keyword, normalized keyword) pairs
+    keywords: List[Tuple[str, str]]
+    # Normalized conditions of each rule, in rule order
+    rule_conditions: List[List[str]]
+
 
 class SkillService:
     """Service for managing skills"""
 
+    # Bumped whenever skills change; shared by all instances so match caches can key on it
+    version = 0
+
+    # version only counts changes made by this process: skills written by other
+    # workers (or paths that don't bump it) are picked up after these TTLs
+    KEYWORD_INDEX_TTL = 60  # seconds
+    MATCH_CACHE_TTL = 60  # seconds
+
+    # Keyword indexes per category filter:
+    # category -> (version, built_at, automaton, {skill_id: SkillTerms})
+    _keyword_indexes: Dict[
+        Optional[str],
+        Tuple[int, float, ahocorasick.Automaton, Dict[str, "SkillTerms"]]
+    ] = {}
+
+    # match_skills results keyed by (normalized content hash, category, version):
+    # key -> (cached_at, matches)
+    MATCH_CACHE_SIZE = 1024
+    _match_cache: "OrderedDict[tuple, Tuple[float, List[Dict]]]" = OrderedDict()
+
+    @classmethod
+    def bump_version(cls) -> None:
+        """Mark skills as changed (invalidates cached skill matches)"""
+        SkillService.version += 1
+
     def __init__(self, data_dir: str = "./data"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
@@ -37,23 +93,7 @@ class SkillService:
             result = await session.execute(query.order_by(Skill.usage_count.desc()))
             skills = result.scalars().all()
 
-            return [
-                SkillResponse(
-                    id=str(s.id),
-                    name=s.name,
-                    name_en=s.name_en,
-                    category=s.category,
-                    description=s.description,
-                    trigger_keywords=s.trigger_keywords or [],
-                    rules=s.rules or [],
-                    usage_count=s.usage_count,
-                    success_count=s.success_count,
-                    is_active=s.is_active,
-                    created_at=s.created_at,
-                    updated_at=s.updated_at
-                )
-                for s in skills
-            ]
+            return _SKILL_LIST_ADAPTER.validate_python(skills, from_attributes=True)
 
     async def get_skill(self, skill_id: str) -> Optional[SkillResponse]:
         """Get a specific skill
@@ -71,22 +111,32 @@ class SkillService:
             skill = result.scalar_one_or_none()
 
             if skill:
-                return SkillResponse(
-                    id=str(skill.id),
-                    name=skill.name,
-                    name_en=skill.name_en,
-                    category=skill.category,
-                    description=skill.description,
-                    trigger_keywords=skill.trigger_keywords or [],
-                    rules=skill.rules or [],
-                    usage_count=skill.usage_count,
-                    success_count=skill.success_count,
-                    is_active=skill.is_active,
-                    created_at=skill.created_at,
-                    updated_at=skill.updated_at
-                )
+                return SkillResponse.model_validate(skill)
             return None
 
+    async def get_skills_by_ids(self, skill_ids: List[str]) -> Dict[str, SkillResponse]:
+        """Get several skills in one query
+
+        Args:
+            skill_ids: Skill IDs
+
+        Returns:
+            Mapping of skill ID to skill (missing IDs are omitted)
+        """
+        if not skill_ids:
+            return {}
+
+        async with async_session() as session:
+            from sqlalchemy import select
+
+            result = await session.execute(select(Skill).where(Skill.id.in_(skill_ids)))
+            skills = result.scalars().all()
+
+            return {
+                skill.id: skill
+                for skill in _SKILL_LIST_ADAPTER.validate_python(skills, from_attributes=True)
+            }
+
     async def create_skill(self, skill_data: SkillCreate) -> SkillResponse:
         """Create a new skill
 
@@ -110,21 +160,9 @@ class SkillService:
             session.add(skill)
             await session.commit()
             await session.refresh(skill)
+            self.bump_version()
 
-            return SkillResponse(
-                id=str(skill.id),
-                name=skill.name,
-                name_en=skill.name_en,
-                category=skill.category,
-                description=skill.description,
-                trigger_keywords=skill.trigger_keywords or [],
-                rules=skill.rules or [],
-                usage_count=skill.usage_count,
-                success_count=skill.success_count,
-                is_active=skill.is_active,
-                created_at=skill.created_at,
-                updated_at=skill.updated_at
-            )
+            return SkillResponse.model_validate(skill)
 
     async def import_from_support_skill(self, skills_data: dict) -> int:
         """Import skills from support-email-composer-skill format
@@ -171,6 +209,7 @@ class SkillService:
                 await session.commit()
                 imported += 1
 
+        self.bump_version()
         return imported
 
     async def match_skills(self, email_content: str, category: str = None) -> List[Dict]:
@@ -181,8 +220,25 @@ class SkillService:
             category: Optional category filter
 
         Returns:
-            List of matched skills with their rules
+            List of matched skills with their rules and matched trigger keywords
         """
+        content_norm = normalize_text(email_content)
+
+        # Read before querying: anything built from this query is cached under
+        # this version, so a concurrent bump_version() invalidates it
+        version = SkillService.version
+
+        # Identical (normalized) content is matched once per skills version
+        cache_key = (
+            hashlib.blake2b(content_norm.encode(), digest_size=16).digest(),
+            category or None,
+            version
+        )
+        cached = SkillService._match_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] <= self.MATCH_CACHE_TTL:
+            SkillService._match_cache.move_to_end(cache_key)
+            return list(cached[1])
+
         async with async_session() as session:
             from sqlalchemy import select
 
@@ -194,23 +250,30 @@ class SkillService:
             skills = result.scalars().all()
 
             matched = []
-            content_lower = email_content.lower()
+
+            # Find every trigger keyword of every skill in one pass over the content
+            automaton, terms_by_skill = self._get_keyword_index(category, skills, version)
+            found = {keyword for _, keyword in automaton.iter(content_norm)} if len(automaton) else set()
 
             for skill in skills:
-                # Check trigger keywords
-                trigger_match = False
-                for keyword in skill.trigger_keywords:
-                    if keyword.lower() in content_lower:
-                        trigger_match = True
-                        break
-
-                if trigger_match:
+                terms = terms_by_skill.get(skill.id)
+                if terms is None or len(terms.rule_conditions) != len(skill.rules or []):
+                    # Rules changed since the index was built: don't pair stale conditions
+                    terms = self._build_skill_terms(skill)
+
+                # Check trigger keywords (all matches are kept for confidence scoring)
+                matched_keywords = [
+                    keyword for keyword, keyword_norm in terms.keywords
+                    if keyword_norm in found
+                ]
+
+                if matched_keywords:
                     # Find matching rules
                     matched_rules = []
-                    for rule in skill.rules or []:
+                    for rule, conditions in zip(skill.rules or [], terms.rule_conditions):
                         rule_match = True
-                        for condition in rule.get("conditions", []):
-                            if condition.lower() not in content_lower:
+                        for condition in conditions:
+                            if condition not in content_norm:
                                 rule_match = False
                                 break
 
@@ -222,10 +285,88 @@ class SkillService:
                         "name": skill.name,
                         "name_en": skill.name_en,
                         "category": skill.category,
+                        "matched_keywords": matched_keywords,
                         "rules": sorted(matched_rules, key=lambda r: r.get("priority", 0), reverse=True)
                     })
 
-            return matched
+        SkillService._match_cache[cache_key] = (time.monotonic(), matched)
+        SkillService._match_cache.move_to_end(cache_key)
+        if len(SkillService._match_cache) > self.MATCH_CACHE_SIZE:
+            SkillService._match_cache.popitem(last=False)
+
+        return list(matched)
+
+    async def warm_keyword_indexes(self) -> None:
+        """Build the keyword indexes for all active skills and for each category up front
+
+        Called at startup so the first matched email does not pay for the build.
+        """
+        version = SkillService.version
+        async with async_session() as session:
+            from sqlalchemy import select
+
+            result = await session.execute(select(Skill).where(Skill.is_active == True))
+            skills = result.scalars().all()
+
+        by_category: Dict[str, List[Skill]] = {}
+        for skill in skills:
+            by_category.setdefault(skill.category, []).append(skill)
+
+        self._get_keyword_index(None, skills, version)
+        for category, category_skills in by_category.items():
+            if category:
+                self._get_keyword_index(category, category_skills, version)
+
+    def _get_keyword_index(
+        self,
+        category: Optional[str],
+        skills: List[Skill],
+        version: int
+    ) -> Tuple[ahocorasick.Automaton, Dict[str, SkillTerms]]:
+        """Get the Aho-Corasick automaton over the skills' normalized trigger keywords
+
+        Keywords and rule conditions are normalized once per build; the index
+        is rebuilt when skills have changed in this process, when a loaded skill
+        is missing from it (created elsewhere) or after KEYWORD_INDEX_TTL.
+
+        Args:
+            category: Category the skills were filtered by (None for all)
+            skills: Active skills, loaded after reading version
+            version: SkillService.version read before the skills were loaded
+        """
+        cached = SkillService._keyword_indexes.get(category)
+        if (
+            cached
+            and cached[0] == version
+            and time.monotonic() - cached[1] <= self.KEYWORD_INDEX_TTL
+            and all(skill.id in cached[3] for skill in skills)
+        ):
+            return cached[2], cached[3]
+
+        automaton = ahocorasick.Automaton()
+        terms_by_skill = {}
+        for skill in skills:
+            terms = self._build_skill_terms(skill)
+            terms_by_skill[skill.id] = terms
+            for _, keyword_norm in terms.keywords:
+                if keyword_norm:
+                    automaton.add_word(keyword_norm, keyword_norm)
+        if len(automaton):
+            automaton.make_automaton()
+
+        SkillService._keyword_indexes[category] = (version, time.monotonic(), automaton, terms_by_skill)
+        return automaton, terms_by_skill
+
+    @staticmethod
+    def _build_skill_terms(skill: Skill) -> SkillTerms:
+        """Normalize a skill's trigger keywords and rule conditions"""
+        return SkillTerms(
+            keywords=[(kw, normalize_text(kw)) for kw in skill.trigger_keywords or []],
+            rule_conditions=[
+                [normalize_text(c) for c in rule.get("conditions", [])]
+                for rule in skill.rules or []
+            ]
+        )
 
     async def increment_usage(self, skill_id: str, success: bool = True) -> None:
         """Increment skill usage counter
@@ -326,4 +467,5 @@ class SkillService:
                     await session.commit()
                     imported += 1
 
+        self.bump_version()
         return imported
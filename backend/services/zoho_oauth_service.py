@@ -2,6 +2,7 @@
 Zoho Mail OAuth 2.0 Service
 Uses Zoho Mail API instead of IMAP/SMTP
 """
+import logging
 import os
 import re
 import json
@@ -12,6 +13,9 @@ from datetime import datetime, timedelta
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
+
 class ZohoOAuthService:
     """Service for Zoho Mail API OAuth authentication and operations"""
 
@@ -27,6 +31,9 @@ class ZohoOAuthService:
     CREDS_FILE = "data/zoho_creds.json"
     TOKENS_FILE = "data/zoho_tokens.json"
 
+    # Seconds a successful connection test is reused by is_connected()
+    CONNECTION_CHECK_TTL = 60
+
     # Supported Zoho regions
     ZOHO_REGIONS = {
         "com": {"auth": "https://accounts.zoho.com/oauth/v2/auth",
@@ -67,6 +74,9 @@ class ZohoOAuthService:
         self.token_expires_at = None
         self.user_email = None
 
+        # time.monotonic() of the last successful connection test (0 = re-test)
+        self._connected_at = 0.0
+
         # Try to load credentials from file first, then fall back to settings
         self._load_credentials()
 
@@ -151,18 +161,18 @@ class ZohoOAuthService:
             "redirect_uri": self.redirect_uri
         }
 
-        print(f"DEBUG: Exchanging token at: {self.TOKEN_URL}")
-        print(f"DEBUG: grant_type=authorization_code")
-        print(f"DEBUG: client_id={self.client_id[:20]}...")
-        print(f"DEBUG: client_secret={'*' * len(self.client_secret) if self.client_secret else 'None'}")
-        print(f"DEBUG: code={code[:20]}...")
-        print(f"DEBUG: redirect_uri={self.redirect_uri}")
+        logger.debug("Exchanging token at: %s", self.TOKEN_URL)
+        logger.debug("grant_type=authorization_code")
+        logger.debug("client_id=%s...", self.client_id[:20])
+        logger.debug("client_secret=%s", '*' * len(self.client_secret) if self.client_secret else 'None')
+        logger.debug("code=%s...", code[:20])
+        logger.debug("redirect_uri=%s", self.redirect_uri)
 
         response = requests.post(self.TOKEN_URL, data=data)
         result = response.json()
 
-        print(f"DEBUG: Response status: {response.status_code}")
-        print(f"DEBUG: Response body: {result}")
+        logger.debug("Response status: %s", response.status_code)
+        logger.debug("Response body: %s", result)
 
         if response.status_code != 200 or "error" in result:
             raise Exception(f"Token exchange failed: {result.get('error', 'Unknown error')}")
@@ -246,13 +256,30 @@ class ZohoOAuthService:
                 # Get user email from first account
                 if data.get("data"):
                     self.user_email = data["data"][0].get("accountEmailAddress", "")
+                self._connected_at = time.monotonic()
                 return True, f"Successfully connected! Using account: {self.user_email or 'Unknown'}"
             else:
+                self._connected_at = 0.0
                 return False, f"API error: {response.status_code} - {response.text}"
 
         except Exception as e:
+            self._connected_at = 0.0
             return False, f"Connection failed: {str(e)}"
 
+    def is_connected(self) -> bool:
+        """Check the API connection, reusing a successful test from the last CONNECTION_CHECK_TTL seconds
+
+        Failed tests are not cached, and a 401 from any API call clears the
+        cached success, so the next check probes the API again.
+
+        Returns:
+            True if connected
+        """
+        if self._connected_at and time.monotonic() - self._connected_at < self.CONNECTION_CHECK_TTL:
+            return True
+        success, _ = self.test_connection()
+        return success
+
     def fetch_emails(
         self,
         count: int = 100,
@@ -302,7 +329,7 @@ class ZohoOAuthService:
                 date_filter_end = datetime.strptime(to_date, "%Y-%m-%d") + timedelta(days=1)
             # "all" means no date filter
         
-        print(f"DEBUG: Date filter: {date_filter_start} to {date_filter_end}")
+        logger.debug("Date filter: %s to %s", date_filter_start, date_filter_end)
 
         headers = self.get_headers()
 
@@ -313,6 +340,8 @@ class ZohoOAuthService:
         )
 
         if accounts_response.status_code != 200:
+            if accounts_response.status_code == 401:
+                self._connected_at = 0.0
             raise Exception(f"Failed to get accounts: {accounts_response.text}")
 
         accounts = accounts_response.json().get("data", [])
@@ -323,13 +352,13 @@ class ZohoOAuthService:
 
         # Get folder ID - use correct Zoho Mail API endpoint
         folders_url = f"{self.API_BASE}/accounts/{account_id}/folders"
-        print(f"DEBUG: Fetching folders from: {folders_url}")
+        logger.debug("Fetching folders from: %s", folders_url)
         folders_response = requests.get(
             folders_url,
             headers=headers
         )
-        print(f"DEBUG: Folders response status: {folders_response.status_code}")
-        print(f"DEBUG: Folders response: {folders_response.text[:500] if folders_response.text else 'empty'}")
+        logger.debug("Folders response status: %s", folders_response.status_code)
+        logger.debug("Folders response: %s", folders_response.text[:500] if folders_response.text else 'empty')
 
         if folders_response.status_code != 200:
             raise Exception(f"Failed to get folders: {folders_response.text}")
@@ -337,17 +366,17 @@ class ZohoOAuthService:
         # Parse folders - Zoho returns data.data[] or data[] depending on endpoint
         folders_data = folders_response.json()
         folders = folders_data.get("data", [])
-        print(f"DEBUG: Found {len(folders)} folders")
+        logger.debug("Found %s folders", len(folders))
         folder_id = None
         for f in folders:
-            print(f"DEBUG: Folder: {f.get('folderName')} (ID: {f.get('folderId')})")
+            logger.debug("Folder: %s (ID: %s)", f.get('folderName'), f.get('folderId'))
             if f.get("folderName") == folder or f.get("name") == folder:
                 folder_id = f.get("folderId") or f.get("id")
                 break
 
         if not folder_id:
             # Use INBOX as default if no folder found
-            print(f"DEBUG: Folder '{folder}' not found, using first inbox-like folder")
+            logger.debug("Folder '%s' not found, using first inbox-like folder", folder)
             for f in folders:
                 if "inbox" in (f.get("folderName", "") or f.get("name", "")).lower():
                     folder_id = f.get("folderId") or f.get("id")
@@ -357,11 +386,11 @@ class ZohoOAuthService:
             # Fallback to first folder
             folder_id = folders[0].get("folderId") or folders[0].get("id")
         
-        print(f"DEBUG: Using folder_id: {folder_id}")
+        logger.debug("Using folder_id: %s", folder_id)
 
         # Fetch emails with pagination - Zoho API returns max 50 per request
         messages_url = f"{self.API_BASE}/accounts/{account_id}/messages/view"
-        print(f"DEBUG: Fetching messages from: {messages_url}")
+        logger.debug("Fetching messages from: %s", messages_url)
         
         all_emails_data = []
         start_index = 0
@@ -370,7 +399,7 @@ class ZohoOAuthService:
         reached_date_limit = False
         
         while len(all_emails_data) < max_emails and not reached_date_limit:
-            print(f"DEBUG: Fetching page starting at index {start_index}")
+            logger.debug("Fetching page starting at index %s", start_index)
             emails_response = requests.get(
                 messages_url,
                 headers=headers,
@@ -380,13 +409,13 @@ class ZohoOAuthService:
                     "start": start_index
                 }
             )
-            print(f"DEBUG: Messages response status: {emails_response.status_code}")
+            logger.debug("Messages response status: %s", emails_response.status_code)
 
             if emails_response.status_code != 200:
                 raise Exception(f"Failed to fetch emails: {emails_response.text}")
 
             page_data = emails_response.json().get("data", [])
-            print(f"DEBUG: Got {len(page_data)} messages in this page")
+            logger.debug("Got %s messages in this page", len(page_data))
             
             if not page_data:
                 # No more emails to fetch
@@ -400,7 +429,7 @@ class ZohoOAuthService:
                     try:
                         oldest_date = datetime.fromtimestamp(int(oldest_date_str) / 1000)
                         if oldest_date < date_filter_start:
-                            print(f"DEBUG: Oldest email {oldest_date} is before filter start {date_filter_start}, will stop after this page")
+                            logger.debug("Oldest email %s is before filter start %s, will stop after this page", oldest_date, date_filter_start)
                             reached_date_limit = True
                     except:
                         pass
@@ -412,7 +441,7 @@ class ZohoOAuthService:
             if len(page_data) < page_size:
                 break
         
-        print(f"DEBUG: Total messages fetched: {len(all_emails_data)}")
+        logger.debug("Total messages fetched: %s", len(all_emails_data))
 
         # Parse emails
         emails = []
@@ -440,15 +469,15 @@ class ZohoOAuthService:
                 if email_date:
                     if email_date < date_filter_start:
                         # Emails are sorted by date desc, so we can stop here
-                        print(f"DEBUG: Email {email_date} is before date range, stopping")
+                        logger.debug("Email %s is before date range, stopping", email_date)
                         break
                     if email_date >= date_filter_end:
-                        print(f"DEBUG: Skipping email after date range: {email_date}")
+                        logger.debug("Skipping email after date range: %s", email_date)
                         continue
             
             emails.append(parsed_email)
 
-        print(f"DEBUG: Returning {len(emails)} emails (after date filter)")
+        logger.debug("Returning %s emails (after date filter)", len(emails))
         return emails
 
     def _strip_html(self, html: str) -> str:
@@ -540,26 +569,26 @@ class ZohoOAuthService:
         # Debug: print available time fields
         time_fields = {k: v for k, v in detail.items() if 'time' in k.lower() or 'date' in k.lower()}
         if time_fields and len(time_fields) < 10:  # Only print if not too many fields
-            print(f"DEBUG: Time fields in email: {time_fields}")
+            logger.debug("Time fields in email: %s", time_fields)
         
         # Try receivedTime first (millisecond timestamp)
         if detail.get("receivedTime"):
             try:
                 received_at = datetime.fromtimestamp(int(detail["receivedTime"]) / 1000)
             except Exception as e:
-                print(f"DEBUG: Error parsing receivedTime: {e}")
+                logger.debug("Error parsing receivedTime: %s", e)
         # Fallback to sentDateInGMT
         elif detail.get("sentDateInGMT"):
             try:
                 received_at = datetime.fromtimestamp(int(detail["sentDateInGMT"]) / 1000)
             except Exception as e:
-                print(f"DEBUG: Error parsing sentDateInGMT: {e}")
+                logger.debug("Error parsing sentDateInGMT: %s", e)
         # Try receivedDate (some Zoho endpoints use this)
         elif detail.get("receivedDate"):
             try:
                 received_at = datetime.fromtimestamp(int(detail["receivedDate"]) / 1000)
             except Exception as e:
-                print(f"DEBUG: Error parsing receivedDate: {e}")
+                logger.debug("Error parsing receivedDate: %s", e)
 
         # Get body - handle both string and dict content formats
         body = ""
@@ -654,6 +683,8 @@ class ZohoOAuthService:
         )
 
         if accounts_response.status_code != 200:
+            if accounts_response.status_code == 401:
+                self._connected_at = 0.0
             raise Exception(f"Failed to get accounts: {accounts_response.text}")
 
         accounts = accounts_response.json().get("data", [])
@@ -706,6 +737,7 @@ class ZohoOAuthService:
             self.refresh_token = None
             self.token_expires_at = None
             self.user_email = None
+            self._connected_at = 0.0
             return True
         except:
             return False
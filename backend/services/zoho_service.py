@@ -1,6 +1,7 @@
 """
 Zoho Mail Service - IMAP/SMTP integration
 """
+import logging
 import imaplib
 import smtplib
 import email
@@ -15,6 +16,9 @@ import uuid
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
+
 class ZohoMailService:
     """Service for interacting with Zoho Mail via IMAP and SMTP"""
 
@@ -78,14 +82,14 @@ class ZohoMailService:
                     emails.append(email_data)
 
                 except Exception as e:
-                    print(f"Error parsing email {email_id}: {e}")
+                    logger.error("Error parsing email %s: %s", email_id, e)
                     continue
 
             mail.close()
             mail.logout()
 
         except Exception as e:
-            print(f"Error fetching emails: {e}")
+            logger.error("Error fetching emails: %s", e)
 
         return emails
 
@@ -192,7 +196,7 @@ class ZohoMailService:
             return True
 
         except Exception as e:
-            print(f"Error sending email: {e}")
+            logger.error("Error sending email: %s", e)
             return False
 
     def test_connection(self) -> Tuple[bool, str]:
@@ -236,7 +240,7 @@ class ZohoMailService:
             return 0
 
         except Exception as e:
-            print(f"Error getting email count: {e}")
+            logger.error("Error getting email count: %s", e)
             return 0
 
 
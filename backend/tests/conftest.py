@@ -0,0 +1,56 @@
+"""
+Test configuration - point the app at a throwaway SQLite database
+
+DATABASE_URL must be set before config/models are imported, since the
+engine is created at import time.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="mailmind-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_TEST_DB_DIR}/test.db"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+from sqlalchemy import delete
+
+from models.database import AgentJob, AgentJobResult, Skill, engine, init_db
+from services.skill_service import SkillService
+
+
+def _run(coro):
+    """Run a coroutine on a fresh event loop, disposing pooled connections before it closes"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    _run(init_db())
+
+
+@pytest.fixture
+def run():
+    return _run
+
+
+@pytest.fixture
+def clean_db():
+    """Empty the tables the tests write to, and reset the skill caches"""
+    async def clear():
+        async with engine.begin() as conn:
+            for model in (AgentJobResult, AgentJob, Skill):
+                await conn.execute(delete(model))
+    _run(clear())
+
+    SkillService._keyword_indexes.clear()
+    SkillService._match_cache.clear()
+    SkillService.version = 0
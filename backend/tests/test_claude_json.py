@@ -0,0 +1,34 @@
+"""
+Tests for parse_json_reply
+"""
+import orjson
+import pytest
+
+from services.claude_json import parse_json_reply
+
+
+def test_plain_json():
+    assert parse_json_reply('{"a": 1}') == {"a": 1}
+
+
+def test_json_code_block():
+    assert parse_json_reply('Here you go:\n```json\n{"a": [1, 2]}\n```\nDone.') == {"a": [1, 2]}
+
+
+def test_generic_code_block():
+    assert parse_json_reply('```\n[1, 2, 3]\n```') == [1, 2, 3]
+
+
+def test_object_surrounded_by_prose():
+    text = 'Sure! The result is {"category": "refund", "nested": {"ok": true}} - hope that helps.'
+    assert parse_json_reply(text) == {"category": "refund", "nested": {"ok": True}}
+
+
+def test_invalid_json_raises():
+    with pytest.raises(orjson.JSONDecodeError):
+        parse_json_reply("no json here")
+
+
+def test_invalid_object_raises():
+    with pytest.raises(orjson.JSONDecodeError):
+        parse_json_reply("prefix {not: valid} suffix")
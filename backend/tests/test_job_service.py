@@ -0,0 +1,62 @@
+"""
+Tests for JobService
+"""
+from services.job_service import JobService
+
+
+def test_batch_job_lifecycle(run, clean_db):
+    service = JobService()
+
+    async def scenario():
+        job_id = await service.create_job("batch_execution", total=3)
+        started = await service.get_job(job_id)
+
+        # Items finish out of order; results come back in batch order
+        await service.add_result(job_id, 2, {"email_id": "c"})
+        await service.add_result(job_id, 0, {"email_id": "a"})
+        in_progress = await service.get_job(job_id)
+
+        await service.add_result(job_id, 1, {"email_id": "b"})
+        await service.finish_job(job_id, "partial", errors=["b failed"])
+        finished = await service.get_job(job_id)
+        return started, in_progress, finished
+
+    started, in_progress, finished = run(scenario())
+
+    assert started["status"] == "started"
+    assert started["agent"] == "batch_execution"
+    assert started["total"] == 3
+    assert started["results"] == []
+    assert started["completed"] == 0
+    assert "completed_at" not in started
+
+    assert in_progress["results"] == [{"email_id": "a"}, {"email_id": "c"}]
+    assert in_progress["completed"] == 2
+
+    assert finished["status"] == "partial"
+    assert finished["errors"] == ["b failed"]
+    assert finished["completed_at"] is not None
+    assert finished["results"] == [{"email_id": "a"}, {"email_id": "b"}, {"email_id": "c"}]
+    assert finished["completed"] == 3
+
+
+def test_learning_job_result(run, clean_db):
+    service = JobService()
+
+    async def scenario():
+        job_id = await service.create_job("learning")
+        await service.finish_job(job_id, "completed", result={"skills_created": 2})
+        return await service.get_job(job_id)
+
+    job = run(scenario())
+
+    assert job["status"] == "completed"
+    assert job["result"] == {"skills_created": 2}
+    # Only batch jobs (with a total) report per-item results
+    assert "results" not in job
+    assert "total" not in job
+    assert "errors" not in job
+
+
+def test_unknown_job(run, clean_db):
+    assert run(JobService().get_job("missing")) is None
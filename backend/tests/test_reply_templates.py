@@ -0,0 +1,27 @@
+"""
+Tests for render_template_vars
+"""
+from services.reply_templates import render_template_vars
+
+
+def test_single_double_and_triple_braces():
+    template = "Dear {customer_name}, {{company_name}} thanks you, {{{customer_name}}}."
+    assert render_template_vars(template, "Alice") == "Dear Alice, We thanks you, Alice."
+
+
+def test_default_customer_name():
+    assert render_template_vars("Hi {customer_name}") == "Hi Customer"
+
+
+def test_unknown_placeholders_left_as_is():
+    template = "Order {{order_id}} for {customer_name}"
+    assert render_template_vars(template, "Bob") == "Order {{order_id}} for Bob"
+
+
+def test_unbalanced_braces_are_consumed():
+    assert render_template_vars("Hi {{customer_name}!", "Bob") == "Hi Bob!"
+
+
+def test_non_placeholder_braces_untouched():
+    template = "Use { customer_name } or {} as-is"
+    assert render_template_vars(template, "Bob") == template
@@ -0,0 +1,126 @@
+"""
+Tests for SkillService.match_skills and keyword normalization
+"""
+import uuid
+
+from models.database import Skill, async_session
+from models.schemas import RuleSchema, SkillCreate
+from services.skill_service import SkillService, normalize_text
+
+
+def _refund_skill(name_en: str = "refund") -> SkillCreate:
+    return SkillCreate(
+        name="Refund",
+        name_en=name_en,
+        category="billing",
+        trigger_keywords=["Refund", "払い戻し"],
+        rules=[
+            RuleSchema(
+                rule_id="r1",
+                name="Refund with order",
+                trigger_keywords=[],
+                conditions=["Order Number"],
+                action_steps=[],
+                response_template="",
+                priority=1
+            ),
+            RuleSchema(
+                rule_id="r2",
+                name="Refund with invoice",
+                trigger_keywords=[],
+                conditions=["invoice"],
+                action_steps=[],
+                response_template="",
+                priority=5
+            ),
+        ]
+    )
+
+
+def test_normalize_text():
+    assert normalize_text("  RÉFUND　 Request ") == "refund request"
+    assert normalize_text("ＲＥＦＵＮＤ") == "refund"
+    # Kana voicing marks are not stripped
+    assert normalize_text("ガイド") == "ガイド"
+
+
+def test_match_normalizes_content_keywords_and_conditions(run, clean_db, tmp_path):
+    service = SkillService(str(tmp_path))
+
+    async def scenario():
+        await service.create_skill(_refund_skill())
+        return await service.match_skills("I'd like a ＲÉFUND, ORDER   number 42 and INVOICE attached")
+
+    matches = run(scenario())
+
+    assert len(matches) == 1
+    assert matches[0]["name_en"] == "refund"
+    assert matches[0]["matched_keywords"] == ["Refund"]
+    # Both rules match; higher priority first
+    assert [rule["rule_id"] for rule in matches[0]["rules"]] == ["r2", "r1"]
+
+
+def test_match_category_filter(run, clean_db, tmp_path):
+    service = SkillService(str(tmp_path))
+
+    async def scenario():
+        await service.create_skill(_refund_skill())
+        return (
+            await service.match_skills("払い戻しをお願いします", category="billing"),
+            await service.match_skills("払い戻しをお願いします", category="shipping"),
+        )
+
+    billing, shipping = run(scenario())
+
+    assert [m["matched_keywords"] for m in billing] == [["払い戻し"]]
+    assert shipping == []
+
+
+def test_create_skill_invalidates_match_cache(run, clean_db, tmp_path):
+    service = SkillService(str(tmp_path))
+    content = "Please refund my order"
+
+    async def scenario():
+        before = await service.match_skills(content)
+        await service.create_skill(_refund_skill())
+        after = await service.match_skills(content)
+        return before, after
+
+    before, after = run(scenario())
+
+    assert before == []
+    assert [m["name_en"] for m in after] == ["refund"]
+
+
+def test_skill_added_elsewhere_is_matched_after_ttl(run, clean_db, tmp_path, monkeypatch):
+    service = SkillService(str(tmp_path))
+    content = "Please refund my order"
+
+    async def add_skill_without_bump():
+        # Simulates another worker process: version is not bumped here
+        async with async_session() as session:
+            session.add(Skill(
+                id=str(uuid.uuid4()),
+                name="Refund",
+                name_en="refund",
+                category="billing",
+                trigger_keywords=["refund"],
+                rules=[]
+            ))
+            await session.commit()
+
+    async def scenario():
+        before = await service.match_skills(content)
+        await add_skill_without_bump()
+        cached = await service.match_skills(content)
+        monkeypatch.setattr(SkillService, "MATCH_CACHE_TTL", 0)
+        expired = await service.match_skills(content)
+        return before, cached, expired
+
+    before, cached, expired = run(scenario())
+
+    assert before == []
+    # Served from the match cache until it expires
+    assert cached == []
+    # The keyword index is rebuilt because the new skill is missing from it
+    assert [m["name_en"] for m in expired] == ["refund"]